@@ -1,7 +1,67 @@
+import copy
+import functools
+import heapq
 import json
-import yaml
-from typing import Dict, List, Set, Tuple
-from collections import defaultdict, deque
+import sys
+from typing import Dict, FrozenSet, Iterator, List, NamedTuple, Tuple
+from collections import deque
+
+# Dependency configuration (simulated) - dựng một lần cho mỗi container
+# In thực tế, sẽ load từ S3 hoặc parameter store
+_DEPENDENCY_CONFIG = {
+    'services': {
+        'auth-service': {
+            'dependencies': [],
+            'priority': 1,
+            'parallel_group': 1,
+            'estimated_deploy_time': 60
+        },
+        'menu-service': {
+            'dependencies': ['auth-service'],
+            'priority': 2,
+            'parallel_group': 2,
+            'estimated_deploy_time': 45
+        },
+        'order-service': {
+            'dependencies': ['auth-service', 'menu-service'],
+            'priority': 3,
+            'parallel_group': 3,
+            'estimated_deploy_time': 90
+        },
+        'payment-service': {
+            'dependencies': ['auth-service'],
+            'priority': 2,
+            'parallel_group': 2,
+            'estimated_deploy_time': 75
+        },
+        'notification-service': {
+            'dependencies': ['auth-service'],
+            'priority': 2,
+            'parallel_group': 2,
+            'estimated_deploy_time': 30
+        },
+        'analytics-service': {
+            'dependencies': ['order-service', 'payment-service'],
+            'priority': 4,
+            'parallel_group': 4,
+            'estimated_deploy_time': 60
+        }
+    },
+    'deployment_strategies': {
+        'parallel_optimized': {
+            'allow_parallel': True,
+            'max_concurrent_per_wave': 3
+        },
+        'priority_based': {
+            'allow_parallel': True,
+            'max_concurrent_per_wave': 2
+        },
+        'sequential': {
+            'allow_parallel': False,
+            'max_concurrent_per_wave': 1
+        }
+    }
+}
 
 def lambda_handler(event, context):
     """
@@ -15,47 +75,10 @@ def lambda_handler(event, context):
         
         print(f"Analyzing dependencies for {len(services)} services with strategy: {strategy}")
         
-        # Load dependency configuration
-        dependency_config = load_dependency_config()
-        
-        # Parse services và dependencies
-        service_info = parse_service_dependencies(services, dependency_config)
-        
-        # Validate dependencies
-        validation_result = validate_dependencies(service_info)
-        if not validation_result['valid']:
-            raise ValueError(f"Invalid dependencies: {validation_result['errors']}")
-        
-        # Tạo deployment waves dựa trên strategy
-        if strategy == "parallel_optimized":
-            waves = create_parallel_optimized_waves(service_info, dependency_config)
-        elif strategy == "priority_based":
-            waves = create_priority_based_waves(service_info, dependency_config)
-        else:
-            waves = create_sequential_waves(service_info)
-        
-        # Tạo detailed deployment plan
-        deployment_plan = create_deployment_plan(waves, strategy, dependency_config)
-        
-        # Estimate deployment time
-        estimated_time = estimate_total_deployment_time(deployment_plan)
+        # Plan được cache theo (services, strategy); copy để caller không sửa cache entry
+        result = copy.deepcopy(plan_deployment(tuple(services), strategy))
         
-        result = {
-            "strategy": strategy,
-            "total_services": len(services),
-            "total_waves": len(waves),
-            "deployment_waves": waves,
-            "deployment_plan": deployment_plan,
-            "estimated_time_seconds": estimated_time,
-            "parallel_optimization": strategy != "sequential",
-            "dependency_analysis": {
-                "total_dependencies": sum(len(info["dependencies"]) for info in service_info.values()),
-                "independent_services": len([s for s, info in service_info.items() if not info["dependencies"]]),
-                "max_dependency_depth": calculate_max_dependency_depth(service_info)
-            }
-        }
-        
-        print(f"Created {len(waves)} deployment waves for {strategy} strategy")
+        print(f"Created {result['total_waves']} deployment waves for {strategy} strategy")
         
         return {
             'statusCode': 200,
@@ -69,98 +92,115 @@ def lambda_handler(event, context):
             'error': str(e)
         }
 
-def load_dependency_config():
-    """Load dependency configuration (simulated)"""
-    # In thực tế, sẽ load từ S3 hoặc parameter store
-    return {
-        'services': {
-            'auth-service': {
-                'dependencies': [],
-                'priority': 1,
-                'parallel_group': 1,
-                'estimated_deploy_time': 60
-            },
-            'menu-service': {
-                'dependencies': ['auth-service'],
-                'priority': 2,
-                'parallel_group': 2,
-                'estimated_deploy_time': 45
-            },
-            'order-service': {
-                'dependencies': ['auth-service', 'menu-service'],
-                'priority': 3,
-                'parallel_group': 3,
-                'estimated_deploy_time': 90
-            },
-            'payment-service': {
-                'dependencies': ['auth-service'],
-                'priority': 2,
-                'parallel_group': 2,
-                'estimated_deploy_time': 75
-            },
-            'notification-service': {
-                'dependencies': ['auth-service'],
-                'priority': 2,
-                'parallel_group': 2,
-                'estimated_deploy_time': 30
-            },
-            'analytics-service': {
-                'dependencies': ['order-service', 'payment-service'],
-                'priority': 4,
-                'parallel_group': 4,
-                'estimated_deploy_time': 60
-            }
-        },
-        'deployment_strategies': {
-            'parallel_optimized': {
-                'allow_parallel': True,
-                'max_concurrent_per_wave': 3
-            },
-            'priority_based': {
-                'allow_parallel': True,
-                'max_concurrent_per_wave': 2
-            },
-            'sequential': {
-                'allow_parallel': False,
-                'max_concurrent_per_wave': 1
-            }
+@functools.lru_cache(maxsize=128)
+def plan_deployment(services: Tuple[str, ...], strategy: str) -> Dict:
+    """
+    Tạo deployment plan cho danh sách services và strategy.
+    
+    Kết quả chỉ phụ thuộc vào input (dependency config là hằng số), nên được
+    memoize cho cả vòng đời container - Step Functions retries dùng lại plan.
+    """
+    # Load dependency configuration
+    dependency_config = load_dependency_config()
+    
+    # Parse services và dependencies
+    service_info = parse_service_dependencies(services, dependency_config)
+    
+    # Phân tích dependency graph một lần, dùng chung cho các bước sau
+    analysis = analyze_dependency_graph(service_info)
+    
+    # Validate dependencies
+    validation_result = validate_dependencies(service_info, analysis)
+    if not validation_result['valid']:
+        raise ValueError(f"Invalid dependencies: {validation_result['errors']}")
+    
+    # Tạo deployment waves dựa trên strategy
+    if strategy == "parallel_optimized":
+        waves = create_parallel_optimized_waves(service_info, dependency_config, analysis)
+    elif strategy == "priority_based":
+        waves = create_priority_based_waves(service_info, dependency_config, analysis)
+    else:
+        waves = create_sequential_waves(service_info, analysis)
+    
+    # Tạo detailed deployment plan
+    deployment_plan = create_deployment_plan(waves, strategy, dependency_config, analysis)
+    
+    # Estimate deployment time
+    estimated_time = estimate_total_deployment_time(deployment_plan)
+    
+    result = {
+        "strategy": strategy,
+        "total_services": len(services),
+        "total_waves": len(waves),
+        "deployment_waves": waves,
+        "deployment_plan": deployment_plan,
+        "estimated_time_seconds": estimated_time,
+        "parallel_optimization": strategy != "sequential",
+        "dependency_analysis": {
+            "total_dependencies": sum(len(info.dependencies) for info in service_info.values()),
+            "independent_services": len([s for s, info in service_info.items() if not info.dependencies]),
+            "max_dependency_depth": calculate_max_dependency_depth(service_info, analysis)
         }
     }
+    
+    return result
 
-def parse_service_dependencies(services: List[str], config: Dict) -> Dict:
+class ServiceInfo(NamedTuple):
+    """Thông tin deploy của một service, dùng nội bộ khi lập plan"""
+    dependencies: FrozenSet[str]
+    priority: int
+    parallel_group: int
+    estimated_deploy_time: int
+
+def load_dependency_config():
+    """Load dependency configuration (simulated)"""
+    return _DEPENDENCY_CONFIG
+
+def parse_service_dependencies(services: List[str], config: Dict) -> Dict[str, ServiceInfo]:
     """Parse service dependencies từ config"""
     service_info = {}
     
     for service in services:
+        # Intern tên service để so sánh/hash trong graph chỉ là so sánh con trỏ
+        service = sys.intern(service)
+        
         if service in config['services']:
             service_config = config['services'][service]
-            service_info[service] = {
-                'dependencies': service_config.get('dependencies', []),
-                'priority': service_config.get('priority', 1),
-                'parallel_group': service_config.get('parallel_group', 1),
-                'estimated_deploy_time': service_config.get('estimated_deploy_time', 60)
-            }
+            service_info[service] = ServiceInfo(
+                dependencies=frozenset(sys.intern(dep) for dep in service_config.get('dependencies', [])),
+                priority=service_config.get('priority', 1),
+                parallel_group=service_config.get('parallel_group', 1),
+                estimated_deploy_time=service_config.get('estimated_deploy_time', 60)
+            )
         else:
             # Default config cho services không có trong config
-            service_info[service] = {
-                'dependencies': [],
-                'priority': 999,
-                'parallel_group': 999,
-                'estimated_deploy_time': 60
-            }
+            service_info[service] = ServiceInfo(
+                dependencies=frozenset(),
+                priority=999,
+                parallel_group=999,
+                estimated_deploy_time=60
+            )
     
     return service_info
 
-def validate_dependencies(service_info: Dict) -> Dict:
+def validate_dependencies(service_info: Dict, analysis: Dict = None) -> Dict:
     """Validate dependencies để tránh circular dependencies"""
     errors = []
     
     # Kiểm tra circular dependencies
-    if has_circular_dependencies(service_info):
+    if analysis is not None:
+        has_cycle = analysis['has_cycle']
+    else:
+        has_cycle = has_circular_dependencies(service_info)
+    
+    if has_cycle:
         errors.append("Circular dependencies detected")
     
     # Kiểm tra missing dependencies
-    missing = check_missing_dependencies(service_info)
+    if analysis is not None:
+        missing = analysis['missing_dependencies']
+    else:
+        missing = check_missing_dependencies(service_info)
     if missing:
         errors.extend([f"Missing dependency: {dep}" for dep in missing])
     
@@ -170,130 +210,96 @@ def validate_dependencies(service_info: Dict) -> Dict:
     }
 
 def has_circular_dependencies(service_info: Dict) -> bool:
-    """Kiểm tra circular dependencies sử dụng DFS"""
-    visited = set()
-    rec_stack = set()
+    """Kiểm tra circular dependencies sử dụng DFS (iterative, 3 màu)"""
+    # 0 = chưa duyệt, 1 = đang trên stack, 2 = đã xong
+    color = {}
     
-    def dfs(service: str) -> bool:
-        visited.add(service)
-        rec_stack.add(service)
+    for root in service_info:
+        if color.get(root, 0):
+            continue
         
-        if service in service_info:
-            for dep in service_info[service]['dependencies']:
-                if dep not in visited:
-                    if dfs(dep):
-                        return True
-                elif dep in rec_stack:
-                    return True
+        color[root] = 1
+        stack = [(root, iter(service_info[root].dependencies))]
         
-        rec_stack.remove(service)
-        return False
-    
-    for service in service_info:
-        if service not in visited:
-            if dfs(service):
-                return True
+        while stack:
+            service, deps = stack[-1]
+            dep = next(deps, None)
+            
+            if dep is None:
+                color[service] = 2
+                stack.pop()
+                continue
+            
+            dep_color = color.get(dep, 0)
+            if dep_color == 1:
+                return True  # Back edge
+            
+            if dep_color == 0:
+                color[dep] = 1
+                dep_deps = service_info[dep].dependencies if dep in service_info else ()
+                stack.append((dep, iter(dep_deps)))
     
     return False
 
 def check_missing_dependencies(service_info: Dict) -> List[str]:
     """Kiểm tra dependencies không tồn tại"""
-    all_services = set(service_info.keys())
-    missing = []
+    missing = set()
     
     for service, info in service_info.items():
-        for dep in info['dependencies']:
-            if dep not in all_services:
-                missing.append(dep)
+        for dep in info.dependencies:
+            if dep not in service_info:
+                missing.add(dep)
     
-    return list(set(missing))
+    return list(missing)
 
-def create_parallel_optimized_waves(service_info: Dict, config: Dict) -> List[Dict]:
+def create_parallel_optimized_waves(service_info: Dict, config: Dict, analysis: Dict = None) -> List[Dict]:
     """Tạo deployment waves tối ưu cho parallel deployment"""
     waves = []
-    deployed = set()
-    remaining = set(service_info.keys())
-    
-    wave_number = 1
+    max_concurrent_per_wave = config['deployment_strategies']['parallel_optimized']['max_concurrent_per_wave']
     
-    while remaining:
-        # Tìm services có thể deploy trong wave này
-        current_wave_services = []
+    # Mỗi wave là group có parallel_group thấp nhất trong số services đã sẵn sàng
+    for wave_number, (min_group, current_wave_services) in enumerate(
+            iterate_ready_groups(service_info, 'parallel_group', analysis), start=1):
+        max_concurrent, wave_time, slot_schedule = schedule_wave_services(
+            service_info, current_wave_services, max_concurrent_per_wave)
         
-        # Group theo parallel_group
-        groups = defaultdict(list)
-        for service in remaining:
-            info = service_info[service]
-            # Kiểm tra dependencies đã được deploy chưa
-            if all(dep in deployed or dep not in service_info for dep in info['dependencies']):
-                groups[info['parallel_group']].append(service)
-        
-        # Lấy group có priority thấp nhất (deploy trước)
-        if groups:
-            min_group = min(groups.keys())
-            current_wave_services = groups[min_group]
-            
-            # Tạo wave
-            wave = {
-                "wave_number": wave_number,
-                "parallel_group": min_group,
-                "services": current_wave_services,
-                "allow_parallel": len(current_wave_services) > 1,
-                "max_concurrent": min(len(current_wave_services), 
-                                    config['deployment_strategies']['parallel_optimized']['max_concurrent_per_wave']),
-                "estimated_time": max(service_info[s]['estimated_deploy_time'] for s in current_wave_services),
-                "deployment_context": {
-                    "wave_type": "parallel_optimized",
-                    "dependencies_satisfied": True
-                }
+        wave = {
+            "wave_number": wave_number,
+            "parallel_group": min_group,
+            "services": current_wave_services,
+            "allow_parallel": len(current_wave_services) > 1,
+            "max_concurrent": max_concurrent,
+            "estimated_time": wave_time,
+            "slot_schedule": slot_schedule,
+            "deployment_context": {
+                "wave_type": "parallel_optimized",
+                "dependencies_satisfied": True
             }
-            
-            waves.append(wave)
-            deployed.update(current_wave_services)
-            remaining -= set(current_wave_services)
-            wave_number += 1
-        else:
-            # Không có service nào có thể deploy
-            raise ValueError(f"Cannot resolve dependencies for remaining services: {remaining}")
+        }
+        
+        waves.append(wave)
     
     return waves
 
-def create_priority_based_waves(service_info: Dict, config: Dict) -> List[Dict]:
+def create_priority_based_waves(service_info: Dict, config: Dict, analysis: Dict = None) -> List[Dict]:
     """Tạo deployment waves theo priority"""
     waves = []
-    deployed = set()
-    remaining = set(service_info.keys())
-    
-    wave_number = 1
-    
-    while remaining:
-        # Tìm services có thể deploy
-        deployable = []
-        for service in remaining:
-            info = service_info[service]
-            if all(dep in deployed or dep not in service_info for dep in info['dependencies']):
-                deployable.append((service, info))
-        
-        if not deployable:
-            raise ValueError(f"Cannot resolve dependencies for remaining services: {remaining}")
-        
-        # Group theo priority
-        priority_groups = defaultdict(list)
-        for service, info in deployable:
-            priority_groups[info['priority']].append(service)
-        
-        # Deploy priority thấp nhất trước
-        min_priority = min(priority_groups.keys())
-        current_wave_services = priority_groups[min_priority]
+    max_concurrent_per_wave = config['deployment_strategies']['priority_based']['max_concurrent_per_wave']
+    
+    # Deploy priority thấp nhất trước trong số services đã sẵn sàng
+    for wave_number, (min_priority, current_wave_services) in enumerate(
+            iterate_ready_groups(service_info, 'priority', analysis), start=1):
+        max_concurrent, wave_time, slot_schedule = schedule_wave_services(
+            service_info, current_wave_services, max_concurrent_per_wave)
         
         wave = {
             "wave_number": wave_number,
             "priority": min_priority,
             "services": current_wave_services,
             "allow_parallel": len(current_wave_services) > 1,
-            "max_concurrent": min(len(current_wave_services), 
-                                config['deployment_strategies']['priority_based']['max_concurrent_per_wave']),
-            "estimated_time": max(service_info[s]['estimated_deploy_time'] for s in current_wave_services),
+            "max_concurrent": max_concurrent,
+            "estimated_time": wave_time,
+            "slot_schedule": slot_schedule,
             "deployment_context": {
                 "wave_type": "priority_based",
                 "priority_level": min_priority
@@ -301,100 +307,223 @@ def create_priority_based_waves(service_info: Dict, config: Dict) -> List[Dict]:
         }
         
         waves.append(wave)
-        deployed.update(current_wave_services)
-        remaining -= set(current_wave_services)
-        wave_number += 1
     
     return waves
 
-def create_sequential_waves(service_info: Dict) -> List[Dict]:
-    """Tạo deployment waves tuần tự"""
-    # Topological sort
-    in_degree = {service: 0 for service in service_info}
+def schedule_wave_services(service_info: Dict, wave_services: List[str],
+                           max_concurrent_per_wave: int) -> Tuple[int, int, List[List[str]]]:
+    """
+    Xếp services của wave vào các slot song song theo LPT (Longest Processing Time).
     
-    for service, info in service_info.items():
-        for dep in info['dependencies']:
-            if dep in in_degree:
-                in_degree[service] += 1
+    Services dài nhất được xếp trước, mỗi service vào slot đang có tải thấp nhất.
+    Trả về (max_concurrent, estimated_time, slot_schedule) với estimated_time là
+    tải của slot nặng nhất - khi wave có nhiều services hơn số slot, các services
+    phải chờ nhau thay vì chạy cùng lúc.
+    """
+    max_concurrent = max(min(len(wave_services), max_concurrent_per_wave), 1)
+    slot_schedule = [[] for _ in range(max_concurrent)]
+    slot_loads = [(0, slot) for slot in range(max_concurrent)]
     
-    queue = deque([service for service, degree in in_degree.items() if degree == 0])
-    waves = []
-    wave_number = 1
+    for service in sorted(wave_services, key=lambda s: service_info[s].estimated_deploy_time, reverse=True):
+        load, slot = heapq.heappop(slot_loads)
+        slot_schedule[slot].append(service)
+        heapq.heappush(slot_loads, (load + service_info[service].estimated_deploy_time, slot))
     
-    while queue:
-        current = queue.popleft()
+    return max_concurrent, max(load for load, _ in slot_loads), slot_schedule
+
+def iterate_ready_groups(service_info: Dict, key: str, analysis: Dict = None) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Duyệt các nhóm services sẵn sàng deploy theo thứ tự `key` tăng dần.
+    
+    Worklist kiểu Kahn: chỉ những services vừa được giải phóng dependencies
+    mới được đưa vào nhóm sẵn sàng, thay vì quét lại toàn bộ mỗi wave.
+    """
+    if analysis is None:
+        analysis = analyze_dependency_graph(service_info)
+    
+    in_degree = dict(analysis['in_degree'])
+    dependents = analysis['dependents']
+    
+    # ready: key -> services; ready_keys: min-heap các key đang có trong ready
+    ready = {}
+    ready_keys = []
+    
+    def mark_ready(service):
+        group = getattr(service_info[service], key)
+        if group not in ready:
+            heapq.heappush(ready_keys, group)
+        ready.setdefault(group, []).append(service)
+    
+    for service, degree in in_degree.items():
+        if degree == 0:
+            mark_ready(service)
+    
+    resolved = 0
+    
+    while ready_keys:
+        min_key = heapq.heappop(ready_keys)
+        current_wave_services = ready.pop(min_key)
         
+        yield min_key, current_wave_services
+        
+        resolved += len(current_wave_services)
+        for current in current_wave_services:
+            for service in dependents.get(current, ()):
+                in_degree[service] -= 1
+                if in_degree[service] == 0:
+                    mark_ready(service)
+    
+    if resolved < len(service_info):
+        # Không có service nào có thể deploy
+        remaining = {service for service, degree in in_degree.items() if degree > 0}
+        raise ValueError(f"Cannot resolve dependencies for remaining services: {remaining}")
+
+def create_sequential_waves(service_info: Dict, analysis: Dict = None) -> List[Dict]:
+    """Tạo deployment waves tuần tự"""
+    if analysis is None:
+        analysis = analyze_dependency_graph(service_info)
+    
+    waves = []
+    
+    for wave_number, current in enumerate(analysis['topological_order'], start=1):
         wave = {
             "wave_number": wave_number,
             "services": [current],
             "allow_parallel": False,
             "max_concurrent": 1,
-            "estimated_time": service_info[current]['estimated_deploy_time'],
+            "estimated_time": service_info[current].estimated_deploy_time,
             "deployment_context": {
                 "wave_type": "sequential"
             }
         }
         
         waves.append(wave)
+    
+    return waves
+
+def analyze_dependency_graph(service_info: Dict) -> Dict:
+    """
+    Phân tích dependency graph trong một lần duyệt.
+    
+    Trả về in_degree, dependents (reverse adjacency), missing dependencies,
+    thứ tự topo (Kahn), độ sâu của từng service và critical path (chuỗi
+    dependencies có tổng estimated_deploy_time dài nhất). Thứ tự topo thiếu
+    services nghĩa là graph có circular dependencies.
+    """
+    in_degree = {service: 0 for service in service_info}
+    dependents = {}
+    missing = {}
+    
+    for service, info in service_info.items():
+        for dep in info.dependencies:
+            if dep in in_degree:
+                in_degree[service] += 1
+                dependents.setdefault(dep, []).append(service)
+            else:
+                missing[dep] = True
+    
+    remaining = dict(in_degree)
+    queue = deque([service for service, degree in remaining.items() if degree == 0])
+    order = []
+    depth = {}
+    earliest_finish = {}
+    critical_dependency = {}
+    
+    while queue:
+        current = queue.popleft()
+        order.append(current)
         
-        # Cập nhật in_degree của các services phụ thuộc current
-        for service, info in service_info.items():
-            if current in info['dependencies']:
-                in_degree[service] -= 1
-                if in_degree[service] == 0:
-                    queue.append(service)
+        # Dependencies đã được xếp trước nên depth/earliest_finish của chúng luôn có sẵn
+        max_dep_depth = 0
+        start_time = 0
+        for dep in service_info[current].dependencies:
+            if dep in depth:
+                if depth[dep] > max_dep_depth:
+                    max_dep_depth = depth[dep]
+                if earliest_finish[dep] > start_time:
+                    start_time = earliest_finish[dep]
+                    critical_dependency[current] = dep
+        
+        depth[current] = max_dep_depth + 1
+        earliest_finish[current] = start_time + service_info[current].estimated_deploy_time
         
-        wave_number += 1
+        # Cập nhật in_degree của các services phụ thuộc current
+        for service in dependents.get(current, ()):
+            remaining[service] -= 1
+            if remaining[service] == 0:
+                queue.append(service)
     
-    return waves
+    # Truy ngược critical path từ service kết thúc muộn nhất
+    critical_path = []
+    critical_path_time = 0
+    if earliest_finish:
+        service = max(earliest_finish, key=earliest_finish.get)
+        critical_path_time = earliest_finish[service]
+        while service is not None:
+            critical_path.append(service)
+            service = critical_dependency.get(service)
+        critical_path.reverse()
+    
+    return {
+        'in_degree': in_degree,
+        'dependents': dependents,
+        'missing_dependencies': list(missing),
+        'topological_order': order,
+        'depth': depth,
+        'critical_path': critical_path,
+        'critical_path_time': critical_path_time,
+        'total_deploy_time': sum(info.estimated_deploy_time for info in service_info.values()),
+        'has_cycle': len(order) < len(service_info)
+    }
 
-def create_deployment_plan(waves: List[Dict], strategy: str, config: Dict) -> Dict:
+def create_deployment_plan(waves: List[Dict], strategy: str, config: Dict, analysis: Dict = None) -> Dict:
     """Tạo deployment plan chi tiết"""
-    total_estimated_time = sum(wave['estimated_time'] for wave in waves)
+    total_estimated_time = 0
+    total_services = 0
+    
+    for wave in waves:
+        total_estimated_time += wave['estimated_time']
+        total_services += len(wave['services'])
+    
+    if analysis is not None:
+        critical_path = analysis['critical_path']
+        critical_path_time = analysis['critical_path_time']
+    else:
+        critical_path = []
+        critical_path_time = 0
+    
+    # Waves là barrier: wave sau chỉ bắt đầu khi wave trước xong, nên optimized time
+    # là tổng LPT time của từng wave; critical path chỉ là cận dưới lý thuyết
+    optimized_time = total_estimated_time
     
-    # Với parallel deployment, một số waves có thể chạy song song
     if strategy == "parallel_optimized":
-        # Tính toán optimized time
-        optimized_time = max(wave['estimated_time'] for wave in waves) if waves else 0
-        time_savings = total_estimated_time - optimized_time
+        # So với deploy lần lượt từng service một
+        sequential_time = analysis['total_deploy_time'] if analysis is not None else total_estimated_time
+        time_savings = sequential_time - optimized_time
     else:
-        optimized_time = total_estimated_time
+        sequential_time = total_estimated_time
         time_savings = 0
     
     return {
         "strategy": strategy,
         "total_waves": len(waves),
-        "total_services": sum(len(wave['services']) for wave in waves),
-        "estimated_sequential_time": total_estimated_time,
+        "total_services": total_services,
+        "estimated_sequential_time": sequential_time,
         "estimated_optimized_time": optimized_time,
         "time_savings_seconds": time_savings,
-        "time_savings_percentage": (time_savings / total_estimated_time * 100) if total_estimated_time > 0 else 0,
+        "time_savings_percentage": (time_savings / sequential_time * 100) if sequential_time > 0 else 0,
         "parallel_efficiency": calculate_parallel_efficiency(waves),
+        "critical_path": critical_path,
+        "critical_path_time": critical_path_time,
         "waves": waves
     }
 
-def calculate_max_dependency_depth(service_info: Dict) -> int:
+def calculate_max_dependency_depth(service_info: Dict, analysis: Dict = None) -> int:
     """Tính độ sâu tối đa của dependency chain"""
-    def get_depth(service: str, visited: Set[str] = None) -> int:
-        if visited is None:
-            visited = set()
-        
-        if service in visited:
-            return 0  # Tránh circular dependency
-        
-        visited.add(service)
-        
-        if service not in service_info or not service_info[service]['dependencies']:
-            return 1
-        
-        max_dep_depth = 0
-        for dep in service_info[service]['dependencies']:
-            dep_depth = get_depth(dep, visited.copy())
-            max_dep_depth = max(max_dep_depth, dep_depth)
-        
-        return max_dep_depth + 1
+    if analysis is None:
+        analysis = analyze_dependency_graph(service_info)
     
-    return max(get_depth(service) for service in service_info.keys())
+    return max(analysis['depth'].values(), default=0)
 
 def calculate_parallel_efficiency(waves: List[Dict]) -> float:
     """Tính hiệu quả parallel deployment"""
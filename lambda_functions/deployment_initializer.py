@@ -1,17 +1,24 @@
 import json
 import boto3
-import uuid
+import secrets
+import time
 from datetime import datetime, timezone
 import os
 
+# Khởi tạo AWS clients một lần cho mỗi container, dùng lại giữa các warm invocations
+cloudwatch_logs = boto3.client('logs')
+LOG_GROUP = '/aws/stepfunctions/restaurant-deployment'
+
 def lambda_handler(event, context):
     """
     Lambda function để khởi tạo deployment context
     """
     try:
         # Tạo deployment ID duy nhất
-        deployment_id = str(uuid.uuid4())
-        timestamp = datetime.now(timezone.utc).isoformat()
+        deployment_id = secrets.token_hex(16)
+        # Đọc đồng hồ một lần cho cả ISO timestamp và CloudWatch timestamp (ms)
+        now_ns = time.time_ns()
+        timestamp = datetime.fromtimestamp(now_ns / 1e9, timezone.utc).isoformat()
         
         # Lấy thông tin từ event
         environment = event.get('environment', 'staging')
@@ -41,16 +48,13 @@ def lambda_handler(event, context):
         print(f"Version: {version}")
         
         # Ghi log vào CloudWatch
-        cloudwatch_logs = boto3.client('logs')
-        log_group = '/aws/stepfunctions/restaurant-deployment'
-        
         try:
             cloudwatch_logs.put_log_events(
-                logGroupName=log_group,
+                logGroupName=LOG_GROUP,
                 logStreamName=f'deployment-{deployment_id}',
                 logEvents=[
                     {
-                        'timestamp': int(datetime.now().timestamp() * 1000),
+                        'timestamp': now_ns // 1_000_000,
                         'message': json.dumps({
                             'event': 'deployment_initialized',
                             'deployment_id': deployment_id,
@@ -1,8 +1,187 @@
 import json
-import boto3
+import functools
 import os
+import string
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 
+# TCP keepalive giữ kết nối HTTPS tới SNS/SES/Logs sống giữa các warm invocations
+AWS_CLIENT_CONFIG = {
+    'tcp_keepalive': True,
+    'connect_timeout': 2,
+    'read_timeout': 5,
+    'retries': {'max_attempts': 2, 'mode': 'standard'}
+}
+
+# Cấu hình notification từ environment variables, đọc một lần cho mỗi container
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
+SENDER_EMAIL = os.environ.get('SENDER_EMAIL')
+RECIPIENT_EMAILS = [email.strip() for email in os.environ.get('RECIPIENT_EMAILS', '').split(',') if email.strip()]
+SLACK_WEBHOOK_URL = os.environ.get('SLACK_WEBHOOK_URL')
+# Chỉ trả về phần đầu của webhook URL trong kết quả, tính sẵn một lần
+SLACK_WEBHOOK_URL_MASK = SLACK_WEBHOOK_URL[:50] + '...' if SLACK_WEBHOOK_URL else None
+
+def minify_html(markup):
+    """Bỏ thụt lề và xuống dòng của khung HTML tĩnh để giảm kích thước payload gửi SES"""
+    return ''.join(line.strip() for line in markup.splitlines())
+
+# Khung HTML email dựng sẵn (đã minify lúc import), mỗi lần gửi chỉ điền các trường của deployment
+HTML_EMAIL_HEAD = string.Template(minify_html("""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>$subject</title>
+        <style>
+            body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }
+            .container { max-width: 600px; margin: 0 auto; background-color: white; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+            .header { background-color: $status_color; color: white; padding: 20px; border-radius: 8px 8px 0 0; text-align: center; }
+            .content { padding: 20px; }
+            .info-grid { display: grid; grid-template-columns: 1fr 1fr; gap: 10px; margin: 20px 0; }
+            .info-item { padding: 10px; background-color: #f8f9fa; border-radius: 4px; }
+            .services-list { background-color: #e8f5e8; padding: 15px; border-radius: 4px; margin: 15px 0; }
+            .error-details { background-color: #f8d7da; border: 1px solid #f5c6cb; padding: 15px; border-radius: 4px; margin: 15px 0; }
+            .footer { background-color: #f8f9fa; padding: 15px; border-radius: 0 0 8px 8px; text-align: center; font-size: 12px; color: #666; }
+            .btn { display: inline-block; padding: 10px 20px; background-color: $status_color; color: white; text-decoration: none; border-radius: 4px; margin: 5px; }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>$status_icon Deployment $status</h1>
+                <p>ID: $deployment_id</p>
+            </div>
+            <div class="content">
+                <div class="info-grid">
+                    <div class="info-item">
+                        <strong>Environment:</strong><br>
+                        $environment
+                    </div>
+                    <div class="info-item">
+                        <strong>Version:</strong><br>
+                        $version
+                    </div>
+                    <div class="info-item">
+                        <strong>Timestamp:</strong><br>
+                        $timestamp
+                    </div>
+                    <div class="info-item">
+                        <strong>Status:</strong><br>
+                        $status
+                    </div>
+                </div>
+    """))
+
+HTML_EMAIL_SERVICES = string.Template(minify_html("""
+                <div class="services-list">
+                    <h3>✅ Services deployed successfully:</h3>
+                    <ul>
+                        <li>$services</li>
+                    </ul>
+                </div>
+    """))
+
+# Không minify nội dung <pre> vì cần giữ nguyên thụt lề của error
+HTML_EMAIL_ERROR = string.Template(minify_html("""
+                <div class="error-details">
+                    <h3>❌ Error Details:</h3>
+                    <pre>
+    """) + "$error</pre></div>")
+
+HTML_EMAIL_FOOTER = minify_html("""
+                <div style="text-align: center; margin: 20px 0;">
+                    <a href="https://console.aws.amazon.com/states/" class="btn">AWS Console</a>
+                    <a href="https://console.aws.amazon.com/cloudwatch/" class="btn">CloudWatch</a>
+                    <a href="https://console.aws.amazon.com/ecs/" class="btn">ECS Console</a>
+                </div>
+            </div>
+            <div class="footer">
+                <p>Automated notification from Restaurant Microservices Deployment System</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """)
+
+# Nội dung text của SNS theo status, chỉ điền các trường của deployment
+SUCCESS_MESSAGE = string.Template("""
+🎉 DEPLOYMENT THÀNH CÔNG
+
+📋 Thông tin Deployment:
+• ID: $deployment_id
+• Environment: $environment
+• Version: $version
+• Thời gian: $timestamp
+
+✅ Services đã deploy thành công:
+$details
+
+🔗 Liên kết hữu ích:
+• AWS Console: https://console.aws.amazon.com/states/
+• CloudWatch Logs: https://console.aws.amazon.com/cloudwatch/
+• ECS Console: https://console.aws.amazon.com/ecs/
+
+Deployment đã hoàn thành thành công! Tất cả microservices đang hoạt động bình thường.
+        """)
+
+FAILED_MESSAGE = string.Template("""
+🚨 DEPLOYMENT THẤT BẠI
+
+📋 Thông tin Deployment:
+• ID: $deployment_id
+• Environment: $environment
+• Version: $version
+• Thời gian: $timestamp
+
+❌ Deployment không thành công$details
+
+🔧 Hành động cần thực hiện:
+• Kiểm tra CloudWatch Logs để xem chi tiết lỗi
+• Xem lại cấu hình services
+• Kiểm tra health endpoints
+• Rollback nếu cần thiết
+
+🔗 Liên kết troubleshooting:
+• AWS Console: https://console.aws.amazon.com/states/
+• CloudWatch Logs: https://console.aws.amazon.com/cloudwatch/
+• ECS Console: https://console.aws.amazon.com/ecs/
+
+Vui lòng kiểm tra và khắc phục sự cố.
+        """)
+
+# Phần cố định của Slack attachment và các field ngắn (title, key trong content)
+SLACK_ATTACHMENT_SKELETON = {"footer": "Restaurant Deployment System"}
+SLACK_SHORT_FIELDS = (
+    ("Deployment ID", 'deployment_id'),
+    ("Environment", 'environment'),
+    ("Version", 'version'),
+    ("Status", 'status')
+)
+
+# Log streams đã được tạo (hoặc đã tồn tại) trong vòng đời container này
+created_log_streams = set()
+
+@functools.lru_cache(maxsize=None)
+def get_aws_client(service_name):
+    """Lấy boto3 client dùng chung cho cả container, tạo ở lần dùng đầu tiên"""
+    # Import boto3 khi cần để cold start không phải load SDK trước
+    import boto3
+    from botocore.config import Config
+    
+    return boto3.client(service_name, config=Config(**AWS_CLIENT_CONFIG))
+
+@functools.lru_cache(maxsize=None)
+def get_http_pool():
+    """Connection pool dùng chung cho Slack webhook, giữ kết nối TLS giữa các invocations"""
+    import urllib3
+    
+    return urllib3.PoolManager(
+        num_pools=2,
+        maxsize=4,
+        retries=urllib3.Retry(total=1),
+        timeout=urllib3.Timeout(connect=2, read=5)
+    )
+
 def lambda_handler(event, context):
     """
     Lambda function để gửi thông báo về kết quả deployment
@@ -20,38 +199,57 @@ def lambda_handler(event, context):
         
         print(f"Sending notification for deployment {deployment_id}: {status}")
         
-        # Khởi tạo AWS clients
-        sns_client = boto3.client('sns')
-        ses_client = boto3.client('ses')
+        # Fire-and-forget: chuyển việc gửi sang một invocation async và trả về ngay
+        if event.get('fire_and_forget') and context is not None:
+            return dispatch_async_notification(event, context, deployment_id, status)
+        
+        # Lấy AWS clients (dùng lại giữa các warm invocations)
+        sns_client = get_aws_client('sns')
+        logs_client = get_aws_client('logs')
+        
+        # Email chưa cấu hình thì bỏ qua hẳn: không tạo SES client, không dựng HTML
+        ses_client = get_aws_client('ses') if email_notifications_enabled() else None
+        
+        # Lấy thời điểm một lần cho cả invocation, các kênh dùng chung
+        now = datetime.now(timezone.utc)
         
         # Tạo nội dung thông báo
         notification_content = create_notification_content(
-            status, deployment_id, environment, version, services_deployed, error
+            status, deployment_id, environment, version, services_deployed, error, now
         )
         
-        # Gửi thông báo qua SNS
-        sns_result = send_sns_notification(sns_client, notification_content)
-        
-        # Gửi email thông báo chi tiết
-        email_result = send_email_notification(ses_client, notification_content)
+        # Gửi SNS, email, CloudWatch log và Slack song song - các kênh độc lập nhau
+        notifications_sent = {}
         
-        # Ghi log vào CloudWatch
-        log_result = log_to_cloudwatch(notification_content)
-        
-        # Gửi thông báo tới Slack (nếu được cấu hình)
-        slack_result = send_slack_notification(notification_content)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            future_to_channel = {
+                executor.submit(send_sns_notification, sns_client, notification_content): 'sns',
+                executor.submit(log_to_cloudwatch, logs_client, notification_content): 'cloudwatch',
+                executor.submit(send_slack_notification, notification_content): 'slack'
+            }
+            
+            if ses_client is not None:
+                future_to_channel[executor.submit(send_email_notification, ses_client, notification_content)] = 'email'
+            else:
+                notifications_sent['email'] = {'sent': False, 'reason': 'Email configuration not found'}
+            
+            for future in as_completed(future_to_channel):
+                channel = future_to_channel[future]
+                try:
+                    notifications_sent[channel] = future.result()
+                except Exception as e:
+                    print(f"Error sending {channel} notification: {str(e)}")
+                    notifications_sent[channel] = {'sent': False, 'error': str(e)}
         
         result = {
             'statusCode': 200,
             'deployment_id': deployment_id,
             'notification_status': status,
             'notifications_sent': {
-                'sns': sns_result,
-                'email': email_result,
-                'cloudwatch': log_result,
-                'slack': slack_result
+                channel: notifications_sent[channel]
+                for channel in ('sns', 'email', 'cloudwatch', 'slack')
             },
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'timestamp': now.isoformat(),
             'message': f'Notifications sent for deployment {status}'
         }
         
@@ -69,77 +267,75 @@ def lambda_handler(event, context):
             'message': 'Failed to send notifications'
         }
 
-def create_notification_content(status, deployment_id, environment, version, services_deployed, error):
-    """Tạo nội dung thông báo"""
-    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+def dispatch_async_notification(event, context, deployment_id, status):
+    """Gọi lại chính notifier với InvocationType=Event để caller không phải chờ"""
+    payload = {key: value for key, value in event.items() if key != 'fire_and_forget'}
     
-    if status == 'SUCCESS':
-        subject = f"✅ Deployment Thành Công - {deployment_id}"
-        
-        message = f"""
-🎉 DEPLOYMENT THÀNH CÔNG
-
-📋 Thông tin Deployment:
-• ID: {deployment_id}
-• Environment: {environment}
-• Version: {version}
-• Thời gian: {timestamp}
-
-✅ Services đã deploy thành công:
-{chr(10).join([f'• {service}' for service in services_deployed])}
+    get_aws_client('lambda').invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',  # Async invoke
+        Payload=json.dumps(payload)
+    )
+    
+    print(f"Notification dispatched asynchronously for deployment {deployment_id}")
+    return {
+        'statusCode': 202,
+        'deployment_id': deployment_id,
+        'notification_status': status,
+        'notifications_sent': {
+            # Chưa gửi trong invocation này; invocation async sẽ gửi thật
+            channel: {'sent': False, 'dispatched': True}
+            for channel in ('sns', 'email', 'cloudwatch', 'slack')
+        },
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'message': f'Notifications dispatched for deployment {status}'
+    }
 
-🔗 Liên kết hữu ích:
-• AWS Console: https://console.aws.amazon.com/states/
-• CloudWatch Logs: https://console.aws.amazon.com/cloudwatch/
-• ECS Console: https://console.aws.amazon.com/ecs/
+@functools.lru_cache(maxsize=2)
+def get_status_chrome(is_success):
+    """Các phần cố định theo kết quả: (subject prefix, message template, slack color, html color, icon)"""
+    if is_success:
+        return ("✅ Deployment Thành Công", SUCCESS_MESSAGE, "good", "#28a745", "✅")
+    return ("❌ Deployment Thất Bại", FAILED_MESSAGE, "danger", "#dc3545", "❌")
 
-Deployment đã hoàn thành thành công! Tất cả microservices đang hoạt động bình thường.
-        """
-        
-        slack_color = "good"
-        
+def create_notification_content(status, deployment_id, environment, version, services_deployed, error, now=None):
+    """Tạo nội dung thông báo"""
+    if now is None:
+        now = datetime.now(timezone.utc)
+    timestamp = now.strftime('%Y-%m-%d %H:%M:%S UTC')
+    epoch_seconds = now.timestamp()
+    
+    # Mọi status khác SUCCESS đều được xử lý như FAILED
+    is_success = status == 'SUCCESS'
+    subject_prefix, message_template, slack_color, _, _ = get_status_chrome(is_success)
+    subject = f"{subject_prefix} - {deployment_id}"
+    
+    if is_success:
+        details = '• ' + '\n• '.join(services_deployed) if services_deployed else ''
     else:  # FAILED
-        subject = f"❌ Deployment Thất Bại - {deployment_id}"
-        
-        error_details = ""
+        details = ""
         if error:
-            error_details = f"\n🔍 Chi tiết lỗi:\n{json.dumps(error, indent=2, ensure_ascii=False)}"
-        
-        message = f"""
-🚨 DEPLOYMENT THẤT BẠI
-
-📋 Thông tin Deployment:
-• ID: {deployment_id}
-• Environment: {environment}
-• Version: {version}
-• Thời gian: {timestamp}
-
-❌ Deployment không thành công{error_details}
-
-🔧 Hành động cần thực hiện:
-• Kiểm tra CloudWatch Logs để xem chi tiết lỗi
-• Xem lại cấu hình services
-• Kiểm tra health endpoints
-• Rollback nếu cần thiết
-
-🔗 Liên kết troubleshooting:
-• AWS Console: https://console.aws.amazon.com/states/
-• CloudWatch Logs: https://console.aws.amazon.com/cloudwatch/
-• ECS Console: https://console.aws.amazon.com/ecs/
-
-Vui lòng kiểm tra và khắc phục sự cố.
-        """
-        
-        slack_color = "danger"
+            details = f"\n🔍 Chi tiết lỗi:\n{json.dumps(error, indent=2, ensure_ascii=False)}"
+    
+    message = message_template.substitute(
+        deployment_id=deployment_id,
+        environment=environment,
+        version=version,
+        timestamp=timestamp,
+        details=details
+    )
     
     return {
         'subject': subject,
         'message': message,
         'status': status,
+        'is_success': is_success,
         'deployment_id': deployment_id,
         'environment': environment,
         'version': version,
         'timestamp': timestamp,
+        'timestamp_ms': int(epoch_seconds * 1000),
+        'timestamp_s': int(epoch_seconds),
         'slack_color': slack_color,
         'services_deployed': services_deployed,
         'error': error
@@ -148,7 +344,7 @@ Vui lòng kiểm tra và khắc phục sự cố.
 def send_sns_notification(sns_client, content):
     """Gửi thông báo qua SNS"""
     try:
-        topic_arn = os.environ.get('SNS_TOPIC_ARN')
+        topic_arn = SNS_TOPIC_ARN
         if not topic_arn:
             return {'sent': False, 'reason': 'SNS_TOPIC_ARN not configured'}
         
@@ -169,13 +365,17 @@ def send_sns_notification(sns_client, content):
         print(f"Error sending SNS notification: {str(e)}")
         return {'sent': False, 'error': str(e)}
 
+def email_notifications_enabled():
+    """Email qua SES chỉ được gửi khi có cả sender và recipients"""
+    return bool(SENDER_EMAIL and RECIPIENT_EMAILS)
+
 def send_email_notification(ses_client, content):
     """Gửi email thông báo chi tiết"""
     try:
-        sender_email = os.environ.get('SENDER_EMAIL')
-        recipient_emails = os.environ.get('RECIPIENT_EMAILS', '').split(',')
+        sender_email = SENDER_EMAIL
+        recipient_emails = RECIPIENT_EMAILS
         
-        if not sender_email or not recipient_emails[0]:
+        if not email_notifications_enabled():
             return {'sent': False, 'reason': 'Email configuration not found'}
         
         # Tạo HTML email
@@ -184,7 +384,7 @@ def send_email_notification(ses_client, content):
         response = ses_client.send_email(
             Source=sender_email,
             Destination={
-                'ToAddresses': [email.strip() for email in recipient_emails if email.strip()]
+                'ToAddresses': recipient_emails
             },
             Message={
                 'Subject': {
@@ -217,100 +417,38 @@ def send_email_notification(ses_client, content):
 
 def create_html_email(content):
     """Tạo HTML email đẹp"""
-    status_color = "#28a745" if content['status'] == 'SUCCESS' else "#dc3545"
-    status_icon = "✅" if content['status'] == 'SUCCESS' else "❌"
+    _, _, _, status_color, status_icon = get_status_chrome(content['is_success'])
     
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>{content['subject']}</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
-            .container {{ max-width: 600px; margin: 0 auto; background-color: white; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-            .header {{ background-color: {status_color}; color: white; padding: 20px; border-radius: 8px 8px 0 0; text-align: center; }}
-            .content {{ padding: 20px; }}
-            .info-grid {{ display: grid; grid-template-columns: 1fr 1fr; gap: 10px; margin: 20px 0; }}
-            .info-item {{ padding: 10px; background-color: #f8f9fa; border-radius: 4px; }}
-            .services-list {{ background-color: #e8f5e8; padding: 15px; border-radius: 4px; margin: 15px 0; }}
-            .error-details {{ background-color: #f8d7da; border: 1px solid #f5c6cb; padding: 15px; border-radius: 4px; margin: 15px 0; }}
-            .footer {{ background-color: #f8f9fa; padding: 15px; border-radius: 0 0 8px 8px; text-align: center; font-size: 12px; color: #666; }}
-            .btn {{ display: inline-block; padding: 10px 20px; background-color: {status_color}; color: white; text-decoration: none; border-radius: 4px; margin: 5px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>{status_icon} Deployment {content['status']}</h1>
-                <p>ID: {content['deployment_id']}</p>
-            </div>
-            <div class="content">
-                <div class="info-grid">
-                    <div class="info-item">
-                        <strong>Environment:</strong><br>
-                        {content['environment']}
-                    </div>
-                    <div class="info-item">
-                        <strong>Version:</strong><br>
-                        {content['version']}
-                    </div>
-                    <div class="info-item">
-                        <strong>Timestamp:</strong><br>
-                        {content['timestamp']}
-                    </div>
-                    <div class="info-item">
-                        <strong>Status:</strong><br>
-                        {content['status']}
-                    </div>
-                </div>
-    """
+    html = HTML_EMAIL_HEAD.substitute(
+        subject=content['subject'],
+        status_color=status_color,
+        status_icon=status_icon,
+        status=content['status'],
+        deployment_id=content['deployment_id'],
+        environment=content['environment'],
+        version=content['version'],
+        timestamp=content['timestamp']
+    )
     
-    if content['status'] == 'SUCCESS' and content['services_deployed']:
-        html += f"""
-                <div class="services-list">
-                    <h3>✅ Services deployed successfully:</h3>
-                    <ul>
-                        {''.join([f'<li>{service}</li>' for service in content['services_deployed']])}
-                    </ul>
-                </div>
-        """
+    if content['is_success'] and content['services_deployed']:
+        html += HTML_EMAIL_SERVICES.substitute(services='</li><li>'.join(content['services_deployed']))
     
-    if content['status'] == 'FAILED' and content['error']:
+    if not content['is_success'] and content['error']:
         error_str = json.dumps(content['error'], indent=2) if isinstance(content['error'], dict) else str(content['error'])
-        html += f"""
-                <div class="error-details">
-                    <h3>❌ Error Details:</h3>
-                    <pre>{error_str}</pre>
-                </div>
-        """
+        html += HTML_EMAIL_ERROR.substitute(error=error_str)
     
-    html += f"""
-                <div style="text-align: center; margin: 20px 0;">
-                    <a href="https://console.aws.amazon.com/states/" class="btn">AWS Console</a>
-                    <a href="https://console.aws.amazon.com/cloudwatch/" class="btn">CloudWatch</a>
-                    <a href="https://console.aws.amazon.com/ecs/" class="btn">ECS Console</a>
-                </div>
-            </div>
-            <div class="footer">
-                <p>Automated notification from Restaurant Microservices Deployment System</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    html += HTML_EMAIL_FOOTER
     
     return html
 
-def log_to_cloudwatch(content):
+def log_to_cloudwatch(cloudwatch_logs, content):
     """Ghi log chi tiết vào CloudWatch"""
     try:
-        cloudwatch_logs = boto3.client('logs')
         log_group = '/aws/stepfunctions/restaurant-deployment'
         log_stream = f'notifications-{content["deployment_id"]}'
         
         log_event = {
-            'timestamp': int(datetime.now().timestamp() * 1000),
+            'timestamp': content['timestamp_ms'],
             'message': json.dumps({
                 'event': 'deployment_notification_sent',
                 'deployment_id': content['deployment_id'],
@@ -320,16 +458,19 @@ def log_to_cloudwatch(content):
                 'services_deployed': content['services_deployed'],
                 'error': content['error'] if content['error'] else None,
                 'notification_timestamp': content['timestamp']
-            }, ensure_ascii=False, indent=2)
+            }, ensure_ascii=False, separators=(',', ':'))  # JSON gọn, Insights vẫn parse được
         }
         
-        try:
-            cloudwatch_logs.create_log_stream(
-                logGroupName=log_group,
-                logStreamName=log_stream
-            )
-        except cloudwatch_logs.exceptions.ResourceAlreadyExistsException:
-            pass  # Log stream already exists
+        # Chỉ tạo log stream khi container này chưa biết stream đã tồn tại
+        if log_stream not in created_log_streams:
+            try:
+                cloudwatch_logs.create_log_stream(
+                    logGroupName=log_group,
+                    logStreamName=log_stream
+                )
+            except cloudwatch_logs.exceptions.ResourceAlreadyExistsException:
+                pass  # Log stream already exists
+            created_log_streams.add(log_stream)
         
         cloudwatch_logs.put_log_events(
             logGroupName=log_group,
@@ -347,69 +488,53 @@ def log_to_cloudwatch(content):
 def send_slack_notification(content):
     """Gửi thông báo tới Slack"""
     try:
-        webhook_url = os.environ.get('SLACK_WEBHOOK_URL')
+        webhook_url = SLACK_WEBHOOK_URL
         if not webhook_url:
             return {'sent': False, 'reason': 'SLACK_WEBHOOK_URL not configured'}
         
-        import requests
-        
-        # Tạo Slack message format
+        # Tạo Slack message format từ khung tĩnh, chỉ điền các giá trị của deployment
+        attachment = dict(
+            SLACK_ATTACHMENT_SKELETON,
+            color=content['slack_color'],
+            title=content['subject'],
+            fields=[
+                {"title": title, "value": content[key], "short": True}
+                for title, key in SLACK_SHORT_FIELDS
+            ],
+            ts=content['timestamp_s']
+        )
         slack_message = {
             "text": f"Deployment {content['status']}: {content['deployment_id']}",
-            "attachments": [
-                {
-                    "color": content['slack_color'],
-                    "title": content['subject'],
-                    "fields": [
-                        {
-                            "title": "Deployment ID",
-                            "value": content['deployment_id'],
-                            "short": True
-                        },
-                        {
-                            "title": "Environment",
-                            "value": content['environment'],
-                            "short": True
-                        },
-                        {
-                            "title": "Version",
-                            "value": content['version'],
-                            "short": True
-                        },
-                        {
-                            "title": "Status",
-                            "value": content['status'],
-                            "short": True
-                        }
-                    ],
-                    "footer": "Restaurant Deployment System",
-                    "ts": int(datetime.now().timestamp())
-                }
-            ]
+            "attachments": [attachment]
         }
         
-        if content['status'] == 'SUCCESS' and content['services_deployed']:
-            slack_message["attachments"][0]["fields"].append({
+        if content['is_success'] and content['services_deployed']:
+            attachment["fields"].append({
                 "title": "Services Deployed",
-                "value": "\n".join([f"• {service}" for service in content['services_deployed']]),
+                "value": "• " + "\n• ".join(content['services_deployed']),
                 "short": False
             })
         
-        if content['status'] == 'FAILED' and content['error']:
+        if not content['is_success'] and content['error']:
             error_str = str(content['error'])[:500]  # Limit error message length
-            slack_message["attachments"][0]["fields"].append({
+            attachment["fields"].append({
                 "title": "Error",
                 "value": f"```{error_str}```",
                 "short": False
             })
         
-        response = requests.post(webhook_url, json=slack_message, timeout=10)
+        response = get_http_pool().request(
+            'POST',
+            webhook_url,
+            body=json.dumps(slack_message).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
         
-        if response.status_code == 200:
+        if response.status == 200:
             print("Slack notification sent successfully")
-            return {'sent': True, 'webhook_url': webhook_url[:50] + '...'}
+            return {'sent': True, 'webhook_url': SLACK_WEBHOOK_URL_MASK}
         else:
-            return {'sent': False, 'error': f'HTTP {response.status_code}'}
+            return {'sent': False, 'error': f'HTTP {response.status}'}
             
     except Exception as e:
         print(f"Error sending Slack notification: {str(e)}")
@@ -1,12 +1,47 @@
+import functools
 import json
+import re
+import threading
 import boto3
-import time
+from botocore.exceptions import WaiterError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+from typing import NamedTuple
+
+# Khởi tạo AWS clients một lần cho mỗi container, dùng lại giữa các warm invocations
+# (low-level clients an toàn khi gọi từ nhiều threads rollback)
+ecs_client = boto3.client('ecs')
+cloudwatch_logs = boto3.client('logs')
+lambda_client = boto3.client('lambda')
+
+# Các services được rollback, theo thứ tự trong kết quả
+ROLLBACK_SERVICES = ('auth-service', 'menu-service', 'order-service', 'payment-service')
+
+# Danh sách task definition ARNs theo (family, status), sống theo vòng đời container.
+# Task definition đã đăng ký thì bất biến, chỉ cần bỏ cache khi deregister
+TASK_DEFINITION_CACHE = {}
+# Các rollback chạy song song trên nhiều threads cùng đọc/ghi cache
+TASK_DEFINITION_CACHE_LOCK = threading.Lock()
+
+# Format: arn:aws:ecs:region:account:task-definition/family:revision
+TASK_DEFINITION_ARN_PATTERN = re.compile(r'task-definition/(?P<family>[^:]+):(?P<revision>\d+)$')
+
+# Log streams đã được tạo (hoặc đã tồn tại) trong vòng đời container này
+created_log_streams = set()
+
+class ServiceConfig(NamedTuple):
+    cluster_name: str
+    service_name: str
+    family_prefix: str
 
 def lambda_handler(event, context):
     """
     Lambda function để thực hiện rollback deployment
     """
+    deployment_context = {}
+    # Log events của invocation này, ghi bằng một lần put_log_events khi kết thúc
+    log_events = []
+    
     try:
         # Lấy thông tin từ event
         deployment_context = event.get('deploymentContext', {})
@@ -15,59 +50,96 @@ def lambda_handler(event, context):
         deployment_id = deployment_context.get('deployment_id')
         environment = deployment_context.get('environment', 'staging')
         
-        print(f"Starting rollback for deployment {deployment_id}")
+        # Event thiếu thông tin thì dừng ngay, không gọi ECS API nào
+        if not deployment_id or not environment or not isinstance(environment, str):
+            error_message = 'Invalid rollback request: deploymentContext must include deployment_id and environment'
+            print(error_message)
+            
+            return {
+                'statusCode': 400,
+                'deployment_id': deployment_id,
+                'rollback_status': 'failed',
+                'error': error_message,
+                'rollback_time': datetime.now(timezone.utc).isoformat(),
+                'message': 'Rollback request rejected'
+            }
         
-        # Khởi tạo AWS clients
-        ecs_client = boto3.client('ecs')
+        print(f"Starting rollback for deployment {deployment_id}")
         
         # Lấy danh sách services cần rollback
-        services_to_rollback = ['auth-service', 'menu-service', 'order-service', 'payment-service']
+        services_to_rollback = ROLLBACK_SERVICES
+        
+        # Lấy thông tin tất cả services bằng một lần describe_services cho mỗi cluster
+        current_services = prefetch_service_info(ecs_client, services_to_rollback, environment)
         
+        # Rollback các services song song - mỗi service chủ yếu chờ ECS API nên threads chạy chồng được
         rollback_results = {}
-        rollback_success = True
         
-        for service_name in services_to_rollback:
-            try:
+        with ThreadPoolExecutor(max_workers=len(services_to_rollback)) as executor:
+            future_to_service = {}
+            for service_name in services_to_rollback:
                 print(f"Rolling back {service_name}...")
-                
-                rollback_result = rollback_service(
-                    ecs_client, 
-                    service_name, 
-                    environment, 
-                    deployment_id
+                future = executor.submit(
+                    rollback_service,
+                    ecs_client,
+                    service_name,
+                    environment,
+                    deployment_id,
+                    current_services.get(service_name)
                 )
+                future_to_service[future] = service_name
+            
+            for future in as_completed(future_to_service):
+                service_name = future_to_service[future]
+                try:
+                    rollback_result = future.result()
+                    
+                    if not rollback_result.get('success', False):
+                        print(f"Rollback failed for {service_name}: {rollback_result.get('error')}")
+                    else:
+                        print(f"Rollback successful for {service_name}")
+                    
+                except Exception as e:
+                    error_message = f"Error rolling back {service_name}: {str(e)}"
+                    print(error_message)
+                    
+                    rollback_result = {
+                        'success': False,
+                        'error': error_message
+                    }
                 
                 rollback_results[service_name] = rollback_result
-                
-                if not rollback_result.get('success', False):
-                    rollback_success = False
-                    print(f"Rollback failed for {service_name}: {rollback_result.get('error')}")
-                else:
-                    print(f"Rollback successful for {service_name}")
-                
-            except Exception as e:
-                error_message = f"Error rolling back {service_name}: {str(e)}"
-                print(error_message)
-                
-                rollback_results[service_name] = {
-                    'success': False,
-                    'error': error_message
-                }
-                rollback_success = False
         
-        # Ghi log rollback
-        log_rollback_activity(deployment_context, rollback_results, rollback_success)
+        # Giữ thứ tự kết quả theo danh sách services
+        rollback_results = {service_name: rollback_results[service_name] for service_name in services_to_rollback}
+        rollback_success = all(result.get('success', False) for result in rollback_results.values())
+        
+        # Thời điểm kết thúc rollback, dùng chung cho log và kết quả
+        rollback_time = datetime.now(timezone.utc)
+        
+        # Ghi log rollback (flush trong finally)
+        log_events.append(build_log_event('deployment_rollback', {
+            'deployment_id': deployment_id,
+            'environment': deployment_context.get('environment'),
+            'rollback_success': rollback_success,
+            'rollback_results': rollback_results,
+            'rollback_timestamp': rollback_time.isoformat()
+        }, rollback_time))
         
         # Gửi thông báo về kết quả rollback
         send_rollback_notification(deployment_context, rollback_results, rollback_success)
         
+        # Mọi service đã chạy lại revision trước, các task definitions riêng của deployment lỗi không còn cần
+        if rollback_success:
+            cleanup_failed_task_definitions(ecs_client, deployment_id)
+        
         result = {
             'statusCode': 200,
             'deployment_id': deployment_id,
             'rollback_status': 'completed' if rollback_success else 'partially_failed',
             'services_rollback_results': rollback_results,
             'rollback_success': rollback_success,
-            'rollback_time': datetime.now(timezone.utc).isoformat(),
+            'rollback_time': rollback_time.isoformat(),
             'original_error': error,
             'message': 'Rollback completed' if rollback_success else 'Rollback completed with some failures'
         }
@@ -79,48 +151,97 @@ def lambda_handler(event, context):
         error_message = f"Critical error during rollback: {str(e)}"
         print(error_message)
         
+        failed_time = datetime.now(timezone.utc)
+        log_events.append(build_log_event('deployment_rollback_failed', {
+            'deployment_id': deployment_context.get('deployment_id') if deployment_context else None,
+            'error': error_message,
+            'rollback_timestamp': failed_time.isoformat()
+        }, failed_time))
+        
         return {
             'statusCode': 500,
             'deployment_id': deployment_context.get('deployment_id') if deployment_context else None,
             'rollback_status': 'failed',
             'error': error_message,
-            'rollback_time': datetime.now(timezone.utc).isoformat(),
+            'rollback_time': failed_time.isoformat(),
             'message': 'Rollback process failed'
         }
+        
+    finally:
+        if log_events:
+            flush_log_events(
+                f'rollback-{deployment_context.get("deployment_id") if deployment_context else None}',
+                log_events
+            )
 
-def rollback_service(ecs_client, service_name, environment, deployment_id):
+def rollback_service(ecs_client, service_name, environment, deployment_id, current_service_info=None):
     """Rollback một service cụ thể về version trước đó"""
     try:
         service_config = get_service_config(service_name, environment)
-        cluster_name = service_config['cluster_name']
-        service_name_full = service_config['service_name']
+        if not service_config:
+            return {'success': False, 'error': f'Unknown service: {service_name}'}
+        cluster_name = service_config.cluster_name
+        service_name_full = service_config.service_name
         
-        # 1. Lấy thông tin service hiện tại
-        current_service_info = get_current_service_info(ecs_client, cluster_name, service_name_full)
+        # 1. Lấy thông tin service hiện tại (nếu chưa được prefetch)
+        if not current_service_info:
+            current_service_info = get_current_service_info(ecs_client, cluster_name, service_name_full)
         if not current_service_info:
             return {'success': False, 'error': 'Service not found'}
         
-        # 2. Tìm task definition trước đó
-        previous_task_def = find_previous_task_definition(
-            ecs_client, 
-            current_service_info['taskDefinition'],
-            deployment_id
-        )
-        
-        if not previous_task_def:
-            return {'success': False, 'error': 'No previous task definition found for rollback'}
+        # 2. Deployment còn đang chạy thì để ECS tự rollback về service revision trước.
+        # rolloutState lấy từ describe_services nên chỉ gọi thêm API khi thật sự cần
+        native_rollback = None
+        if current_service_info.get('rolloutState') == 'IN_PROGRESS':
+            native_rollback = stop_service_deployment_with_rollback(ecs_client, cluster_name, service_name_full)
         
-        # 3. Cập nhật service với task definition cũ
-        rollback_result = update_service_to_previous_version(
-            ecs_client,
-            cluster_name,
-            service_name_full,
-            previous_task_def,
-            current_service_info['desiredCount']
-        )
-        
-        if not rollback_result['success']:
-            return rollback_result
+        if native_rollback:
+            previous_task_def = None
+            rollback_method = 'stop_service_deployment'
+        else:
+            # 3. Fallback: tìm task definition trước đó và cập nhật service
+            previous_task_def = find_previous_task_definition(
+                ecs_client, 
+                current_service_info['taskDefinition'],
+                deployment_id
+            )
+            
+            if not previous_task_def:
+                return {'success': False, 'error': 'No previous task definition found for rollback'}
+            
+            rollback_result = update_service_to_previous_version(
+                ecs_client,
+                cluster_name,
+                service_name_full,
+                previous_task_def,
+                current_service_info['desiredCount']
+            )
+            
+            if not rollback_result['success']:
+                # Cache có thể đã cũ nếu revision bị deregister bên ngoài: list lại một lần rồi thử lại
+                refreshed_task_def = find_previous_task_definition(
+                    ecs_client,
+                    current_service_info['taskDefinition'],
+                    deployment_id,
+                    refresh=True
+                )
+                
+                if not refreshed_task_def or refreshed_task_def == previous_task_def:
+                    return rollback_result
+                
+                previous_task_def = refreshed_task_def
+                rollback_result = update_service_to_previous_version(
+                    ecs_client,
+                    cluster_name,
+                    service_name_full,
+                    previous_task_def,
+                    current_service_info['desiredCount']
+                )
+                
+                if not rollback_result['success']:
+                    return rollback_result
+            
+            rollback_method = 'task_definition'
         
         # 4. Chờ rollback hoàn thành
         wait_result = wait_for_rollback_completion(
@@ -132,6 +253,7 @@ def rollback_service(ecs_client, service_name, environment, deployment_id):
         
         return {
             'success': True,
+            'rollback_method': rollback_method,
             'previous_task_definition': previous_task_def,
             'current_task_definition': current_service_info['taskDefinition'],
             'rollback_deployment_status': wait_result,
@@ -145,64 +267,114 @@ def rollback_service(ecs_client, service_name, environment, deployment_id):
             'rollback_time': datetime.now(timezone.utc).isoformat()
         }
 
+@functools.lru_cache(maxsize=32)
 def get_service_config(service_name, environment):
-    """Lấy cấu hình cho service"""
-    base_config = {
-        'auth-service': {
-            'cluster_name': f'restaurant-{environment}',
-            'service_name': f'auth-service-{environment}',
-            'family_prefix': 'auth-service'
-        },
-        'menu-service': {
-            'cluster_name': f'restaurant-{environment}',
-            'service_name': f'menu-service-{environment}',
-            'family_prefix': 'menu-service'
-        },
-        'order-service': {
-            'cluster_name': f'restaurant-{environment}',
-            'service_name': f'order-service-{environment}',
-            'family_prefix': 'order-service'
-        },
-        'payment-service': {
-            'cluster_name': f'restaurant-{environment}',
-            'service_name': f'payment-service-{environment}',
-            'family_prefix': 'payment-service'
-        }
-    }
+    """Lấy cấu hình cho service (bất biến, cache theo service và environment). Trả về None nếu không biết service"""
+    if service_name not in ROLLBACK_SERVICES:
+        return None
+    
+    return ServiceConfig(
+        cluster_name=f'restaurant-{environment}',
+        service_name=f'{service_name}-{environment}',
+        family_prefix=service_name
+    )
+
+def prefetch_service_info(ecs_client, services, environment):
+    """Lấy thông tin hiện tại của các services, gom theo cluster. Trả về dict theo tên service ngắn"""
+    services_by_cluster = {}
+    for service_name in services:
+        service_config = get_service_config(service_name, environment)
+        if service_config:
+            services_by_cluster.setdefault(service_config.cluster_name, {})[service_config.service_name] = service_name
+    
+    current_services = {}
+    for cluster_name, name_map in services_by_cluster.items():
+        described = batch_describe_services(ecs_client, cluster_name, list(name_map))
+        for service_name_full, service_info in described.items():
+            current_services[name_map[service_name_full]] = service_info
+    
+    return current_services
+
+def batch_describe_services(ecs_client, cluster_name, service_names):
+    """Describe nhiều services trong một cluster (tối đa 10 services mỗi request). Trả về dict theo serviceName"""
+    services_info = {}
+    
+    for start in range(0, len(service_names), 10):
+        try:
+            response = ecs_client.describe_services(
+                cluster=cluster_name,
+                services=service_names[start:start + 10]
+            )
+        except Exception as e:
+            print(f"Error describing services in {cluster_name}: {str(e)}")
+            continue
+        
+        for service in response['services']:
+            services_info[service['serviceName']] = summarize_service(service)
     
-    return base_config.get(service_name, {})
+    return services_info
+
+def summarize_service(service):
+    """Các trường của service cần cho rollback"""
+    primary_deployment = next(
+        (deployment for deployment in service.get('deployments', []) if deployment.get('status') == 'PRIMARY'),
+        {}
+    )
+    
+    return {
+        'serviceName': service['serviceName'],
+        'taskDefinition': service['taskDefinition'],
+        'desiredCount': service['desiredCount'],
+        'runningCount': service['runningCount'],
+        'status': service['status'],
+        'rolloutState': primary_deployment.get('rolloutState')
+    }
 
 def get_current_service_info(ecs_client, cluster_name, service_name):
     """Lấy thông tin service hiện tại"""
+    return batch_describe_services(ecs_client, cluster_name, [service_name]).get(service_name)
+
+def stop_service_deployment_with_rollback(ecs_client, cluster_name, service_name):
+    """Dừng deployment đang chạy với stopType=ROLLBACK. Trả về None nếu không có deployment nào đang chạy"""
     try:
-        response = ecs_client.describe_services(
+        response = ecs_client.list_service_deployments(
             cluster=cluster_name,
-            services=[service_name]
+            service=service_name,
+            status=['PENDING', 'IN_PROGRESS']
         )
         
-        if not response['services']:
+        if not response['serviceDeployments']:
             return None
         
-        service = response['services'][0]
+        service_deployment_arn = response['serviceDeployments'][0]['serviceDeploymentArn']
         
-        return {
-            'serviceName': service['serviceName'],
-            'taskDefinition': service['taskDefinition'],
-            'desiredCount': service['desiredCount'],
-            'runningCount': service['runningCount'],
-            'status': service['status']
-        }
+        ecs_client.stop_service_deployment(
+            serviceDeploymentArn=service_deployment_arn,
+            stopType='ROLLBACK'
+        )
+        
+        print(f"Stopped service deployment {service_deployment_arn} with ECS rollback")
+        return {'success': True, 'service_deployment_arn': service_deployment_arn}
         
     except Exception as e:
-        print(f"Error getting current service info: {str(e)}")
+        print(f"ECS rollback not available for {service_name}, falling back to task definition: {str(e)}")
         return None
 
-def find_previous_task_definition(ecs_client, current_task_def_arn, deployment_id):
-    """Tìm task definition trước đó để rollback"""
+def parse_task_definition_arn(task_def_arn):
+    """Tách (family, revision) từ task definition ARN, (None, None) nếu ARN không đúng format"""
+    match = TASK_DEFINITION_ARN_PATTERN.search(task_def_arn)
+    if not match:
+        return None, None
+    return match.group('family'), int(match.group('revision'))
+
+def find_previous_task_definition(ecs_client, current_task_def_arn, deployment_id, refresh=False):
+    """Tìm task definition trước đó để rollback. refresh=True bỏ qua danh sách đã cache"""
     try:
-        # Extract family name từ current task definition ARN
-        # Format: arn:aws:ecs:region:account:task-definition/family:revision
-        family_name = current_task_def_arn.split('/')[-1].split(':')[0]
+        # Extract family name và revision từ current task definition ARN
+        family_name, current_revision = parse_task_definition_arn(current_task_def_arn)
+        if family_name is None:
+            print(f"Unrecognized task definition ARN: {current_task_def_arn}")
+            return None
         
         # Loại bỏ deployment ID khỏi family name nếu có
         if deployment_id in family_name:
@@ -210,20 +382,43 @@ def find_previous_task_definition(ecs_client, current_task_def_arn, deployment_i
         else:
             base_family = family_name
         
-        # Liệt kê các task definitions của family
-        response = ecs_client.list_task_definitions(
-            familyPrefix=base_family,
-            status='ACTIVE',
-            sort='DESC'  # Sắp xếp theo thứ tự mới nhất trước
-        )
+        # Liệt kê các task definitions của family. Danh sách cache chỉ dùng được khi đã chứa
+        # revision hiện tại, nếu không thì đã có revision mới đăng ký sau lần cache
+        cache_key = (base_family, 'ACTIVE')
+        if refresh:
+            invalidate_task_definition_cache(base_family)
         
-        task_definitions = response['taskDefinitionArns']
+        with TASK_DEFINITION_CACHE_LOCK:
+            task_definitions = TASK_DEFINITION_CACHE.get(cache_key)
+        
+        if task_definitions is None or current_task_def_arn not in task_definitions:
+            response = ecs_client.list_task_definitions(
+                familyPrefix=base_family,
+                status='ACTIVE',
+                sort='DESC'  # Sắp xếp theo thứ tự mới nhất trước
+            )
+            
+            task_definitions = response['taskDefinitionArns']
+            with TASK_DEFINITION_CACHE_LOCK:
+                TASK_DEFINITION_CACHE[cache_key] = task_definitions
+        
+        # Tìm revision cũ hơn gần nhất của base family, không phải của deployment hiện tại.
+        # Nếu current nằm trong family riêng của deployment thì mọi revision của base family đều hợp lệ
+        same_family = family_name == base_family
+        previous_task_def, previous_revision = None, 0
         
-        # Tìm task definition gần nhất không phải là của deployment hiện tại
         for task_def_arn in task_definitions:
-            if deployment_id not in task_def_arn and task_def_arn != current_task_def_arn:
-                print(f"Found previous task definition for rollback: {task_def_arn}")
-                return task_def_arn
+            family, revision = parse_task_definition_arn(task_def_arn)
+            if family != base_family or task_def_arn == current_task_def_arn or deployment_id in task_def_arn:
+                continue
+            if same_family and revision >= current_revision:
+                continue
+            if revision > previous_revision:
+                previous_task_def, previous_revision = task_def_arn, revision
+        
+        if previous_task_def:
+            print(f"Found previous task definition for rollback: {previous_task_def}")
+            return previous_task_def
         
         # Nếu không tìm thấy, thử tìm task definition cũ nhất
         if len(task_definitions) > 1:
@@ -268,89 +463,84 @@ def update_service_to_previous_version(ecs_client, cluster_name, service_name, p
         }
 
 def wait_for_rollback_completion(ecs_client, cluster_name, service_name, max_wait_time=300):
-    """Chờ rollback hoàn thành"""
-    start_time = time.time()
-    
+    """Chờ rollback hoàn thành bằng ECS waiter services_stable (backoff do SDK quản lý)"""
     print(f"Waiting for rollback completion of {service_name}...")
     
-    while time.time() - start_time < max_wait_time:
-        try:
-            response = ecs_client.describe_services(
-                cluster=cluster_name,
-                services=[service_name]
-            )
-            
-            if not response['services']:
-                return {'status': 'ERROR', 'message': 'Service not found'}
-            
-            service = response['services'][0]
-            deployments = service['deployments']
-            
-            # Tìm PRIMARY deployment
-            primary_deployment = next(
-                (d for d in deployments if d['status'] == 'PRIMARY'), 
-                None
-            )
-            
-            if primary_deployment:
-                running_count = primary_deployment['runningCount']
-                desired_count = primary_deployment['desiredCount']
-                
-                print(f"Rollback progress: {running_count}/{desired_count} tasks")
-                
-                # Kiểm tra xem còn deployment cũ nào đang PENDING không
-                pending_deployments = [d for d in deployments if d['status'] == 'PENDING']
-                
-                if running_count == desired_count and not pending_deployments:
-                    return {
-                        'status': 'COMPLETED',
-                        'running_count': running_count,
-                        'desired_count': desired_count,
-                        'deployment_id': primary_deployment['id']
-                    }
-            
-            time.sleep(10)
-            
-        except Exception as e:
-            print(f"Error checking rollback status: {str(e)}")
-            time.sleep(10)
+    try:
+        ecs_client.get_waiter('services_stable').wait(
+            cluster=cluster_name,
+            services=[service_name],
+            WaiterConfig={'Delay': 6, 'MaxAttempts': max(max_wait_time // 6, 1)}
+        )
+    except WaiterError as e:
+        if 'Max attempts exceeded' in str(e):
+            return {
+                'status': 'TIMEOUT',
+                'message': f'Rollback did not complete within {max_wait_time} seconds'
+            }
+        return {'status': 'ERROR', 'message': str(e)}
+    
+    # Service đã ổn định: chỉ còn một deployment PRIMARY với running == desired
+    try:
+        response = ecs_client.describe_services(
+            cluster=cluster_name,
+            services=[service_name]
+        )
+    except Exception as e:
+        print(f"Error checking rollback status: {str(e)}")
+        return {'status': 'ERROR', 'message': str(e)}
+    
+    if not response['services']:
+        return {'status': 'ERROR', 'message': 'Service not found'}
+    
+    primary_deployment = next(
+        (d for d in response['services'][0]['deployments'] if d['status'] == 'PRIMARY'),
+        None
+    )
+    
+    if not primary_deployment:
+        return {'status': 'ERROR', 'message': 'No PRIMARY deployment found'}
+    
+    print(f"Rollback progress: {primary_deployment['runningCount']}/{primary_deployment['desiredCount']} tasks")
+    
+    return {
+        'status': 'COMPLETED',
+        'running_count': primary_deployment['runningCount'],
+        'desired_count': primary_deployment['desiredCount'],
+        'deployment_id': primary_deployment['id']
+    }
+
+def build_log_event(event_name, fields, event_time=None):
+    """Tạo một CloudWatch log event với message JSON gọn"""
+    if event_time is None:
+        event_time = datetime.now(timezone.utc)
     
     return {
-        'status': 'TIMEOUT',
-        'message': f'Rollback did not complete within {max_wait_time} seconds'
+        'timestamp': int(event_time.timestamp() * 1000),
+        'message': json.dumps({'event': event_name, **fields}, separators=(',', ':'))  # JSON gọn, giảm bytes gửi lên CloudWatch
     }
 
-def log_rollback_activity(deployment_context, rollback_results, rollback_success):
-    """Ghi log rollback activity"""
+def flush_log_events(log_stream, log_events):
+    """Ghi tất cả log events của invocation bằng một lần put_log_events"""
     try:
-        cloudwatch_logs = boto3.client('logs')
         log_group = '/aws/stepfunctions/restaurant-deployment'
-        log_stream = f'rollback-{deployment_context.get("deployment_id")}'
-        
-        log_event = {
-            'timestamp': int(datetime.now().timestamp() * 1000),
-            'message': json.dumps({
-                'event': 'deployment_rollback',
-                'deployment_id': deployment_context.get('deployment_id'),
-                'environment': deployment_context.get('environment'),
-                'rollback_success': rollback_success,
-                'rollback_results': rollback_results,
-                'rollback_timestamp': datetime.now(timezone.utc).isoformat()
-            }, indent=2)
-        }
         
-        try:
-            cloudwatch_logs.create_log_stream(
-                logGroupName=log_group,
-                logStreamName=log_stream
-            )
-        except cloudwatch_logs.exceptions.ResourceAlreadyExistsException:
-            pass
+        # Chỉ tạo log stream khi container này chưa biết stream đã tồn tại
+        if log_stream not in created_log_streams:
+            try:
+                cloudwatch_logs.create_log_stream(
+                    logGroupName=log_group,
+                    logStreamName=log_stream
+                )
+            except cloudwatch_logs.exceptions.ResourceAlreadyExistsException:
+                pass
+            created_log_streams.add(log_stream)
         
+        # CloudWatch yêu cầu events trong một batch theo thứ tự thời gian
         cloudwatch_logs.put_log_events(
             logGroupName=log_group,
             logStreamName=log_stream,
-            logEvents=[log_event]
+            logEvents=sorted(log_events, key=lambda log_event: log_event['timestamp'])
         )
         
         print(f"Rollback activity logged to CloudWatch")
@@ -362,8 +552,6 @@ def send_rollback_notification(deployment_context, rollback_results, rollback_su
     """Gửi thông báo về kết quả rollback"""
     try:
         # Gọi deployment notifier để gửi thông báo rollback
-        lambda_client = boto3.client('lambda')
-        
         notification_payload = {
             'status': 'ROLLBACK_SUCCESS' if rollback_success else 'ROLLBACK_PARTIAL',
             'deployment_context': deployment_context,
@@ -371,10 +559,11 @@ def send_rollback_notification(deployment_context, rollback_results, rollback_su
             'rollback_success': rollback_success
         }
         
-        response = lambda_client.invoke(
+        # Async invoke không có response body cần đọc
+        lambda_client.invoke(
             FunctionName='deployment-notifier',
             InvocationType='Event',  # Async invoke
-            Payload=json.dumps(notification_payload)
+            Payload=json.dumps(notification_payload, separators=(',', ':')).encode('utf-8')
         )
         
         print(f"Rollback notification sent")
@@ -382,25 +571,48 @@ def send_rollback_notification(deployment_context, rollback_results, rollback_su
     except Exception as e:
         print(f"Error sending rollback notification: {str(e)}")
 
+def invalidate_task_definition_cache(family, deployment_id=None):
+    """Bỏ các danh sách task definition đã cache của family (và family riêng của deployment nếu có)"""
+    families = {family}
+    if deployment_id:
+        families.add(f'{family}-{deployment_id}')
+    
+    with TASK_DEFINITION_CACHE_LOCK:
+        for cache_key in [key for key in TASK_DEFINITION_CACHE if key[0] in families]:
+            TASK_DEFINITION_CACHE.pop(cache_key, None)
+
 def cleanup_failed_task_definitions(ecs_client, deployment_id):
     """Dọn dẹp các task definitions không sử dụng từ deployment thất bại"""
     try:
-        # Tìm tất cả task definitions có chứa deployment_id
-        families = ['auth-service', 'menu-service', 'order-service', 'payment-service']
-        
-        for family in families:
-            response = ecs_client.list_task_definitions(
-                familyPrefix=f'{family}-{deployment_id}',
-                status='ACTIVE'
-            )
+        # List và deregister song song: deregister của một family bắt đầu ngay khi list của family đó xong
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            # Tìm tất cả task definitions có chứa deployment_id
+            list_futures = {
+                executor.submit(
+                    ecs_client.list_task_definitions,
+                    familyPrefix=f'{family}-{deployment_id}',
+                    status='ACTIVE'
+                ): family
+                for family in ROLLBACK_SERVICES
+            }
             
-            for task_def_arn in response['taskDefinitionArns']:
-                try:
+            deregister_futures = {}
+            for future in as_completed(list_futures):
+                family = list_futures[future]
+                for task_def_arn in future.result()['taskDefinitionArns']:
                     # Deregister task definition
-                    ecs_client.deregister_task_definition(
+                    deregister_future = executor.submit(
+                        ecs_client.deregister_task_definition,
                         taskDefinition=task_def_arn
                     )
+                    deregister_futures[deregister_future] = (family, task_def_arn)
+            
+            for future in as_completed(deregister_futures):
+                family, task_def_arn = deregister_futures[future]
+                try:
+                    future.result()
                     print(f"Deregistered task definition: {task_def_arn}")
+                    invalidate_task_definition_cache(family, deployment_id)
                     
                 except Exception as e:
                     print(f"Error deregistering task definition {task_def_arn}: {str(e)}")
@@ -408,4 +620,4 @@ def cleanup_failed_task_definitions(ecs_client, deployment_id):
         print(f"Cleanup completed for deployment {deployment_id}")
         
     except Exception as e:
-        print(f"Error during cleanup: {str(e)}") 
\ No newline at end of file
+        print(f"Error during cleanup: {str(e)}")
@@ -1,14 +1,93 @@
 import json
 import boto3
-import requests
+import urllib3
 import time
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from botocore.config import Config
+from urllib3.exceptions import NewConnectionError, ProtocolError
+from urllib3.exceptions import TimeoutError as HTTPTimeoutError
+
+# Khởi tạo AWS clients một lần cho mỗi container, dùng lại giữa các warm invocations.
+# Pool lớn hơn mặc định (10) để các describe calls song song không phải chờ connection
+AWS_CLIENT_CONFIG = Config(max_pool_connections=32, retries={'max_attempts': 2, 'mode': 'standard'})
+ecs_client = boto3.client('ecs', config=AWS_CLIENT_CONFIG)
+ec2_client = boto3.client('ec2', config=AWS_CLIENT_CONFIG)
+
+# Thời gian tối đa (giây) chờ health check của các services, một service bị treo không giữ cả Lambda
+SERVICE_CHECK_TIMEOUT = 30
+
+# HTTP pool dùng chung cho cả container: giữ kết nối keep-alive tới các tasks giữa các lần probe.
+# Probe chỉ cần status code nên gọi thẳng urllib3, bỏ qua overhead của requests (session, cookies, hooks)
+http_pool = urllib3.PoolManager(num_pools=16, maxsize=32, retries=False)
+
+# Cấu hình tĩnh của các services, dựng một lần khi load module
+SERVICE_CONFIG = {
+    'auth-service': {
+        'cluster_name': 'restaurant-staging',
+        'service_name': 'auth-service-staging',
+        'port': 8080,
+        'health_path': '/health'
+    },
+    'menu-service': {
+        'cluster_name': 'restaurant-staging',
+        'service_name': 'menu-service-staging',
+        'port': 8081,
+        'health_path': '/health'
+    },
+    'order-service': {
+        'cluster_name': 'restaurant-staging',
+        'service_name': 'order-service-staging',
+        'port': 8082,
+        'health_path': '/health'
+    },
+    'payment-service': {
+        'cluster_name': 'restaurant-staging',
+        'service_name': 'payment-service-staging',
+        'port': 8083,
+        'health_path': '/health'
+    }
+}
+
+# Các cặp services cần kiểm tra connectivity (from -> to)
+CONNECTIVITY_TESTS = (
+    {
+        'from': 'menu-service',
+        'to': 'auth-service',
+        'endpoint': '/validate-token',
+        'description': 'Menu service -> Auth service token validation'
+    },
+    {
+        'from': 'order-service',
+        'to': 'auth-service',
+        'endpoint': '/validate-token',
+        'description': 'Order service -> Auth service token validation'
+    },
+    {
+        'from': 'order-service',
+        'to': 'menu-service',
+        'endpoint': '/menu/items',
+        'description': 'Order service -> Menu service item lookup'
+    },
+    {
+        'from': 'order-service',
+        'to': 'payment-service',
+        'endpoint': '/payment/process',
+        'description': 'Order service -> Payment service payment processing'
+    }
+)
+
+# Executor riêng cho connectivity tests để không phải chờ sau các service checks bị treo
+connectivity_executor = ThreadPoolExecutor(max_workers=len(CONNECTIVITY_TESTS), thread_name_prefix='final-hc-conn')
 
 def lambda_handler(event, context):
     """
     Lambda function để kiểm tra tổng thể health của tất cả microservices
     """
+    # Thời điểm kiểm tra, dùng chung cho mọi kết quả của invocation
+    check_time = datetime.now(timezone.utc).isoformat()
+    
     try:
         # Lấy thông tin từ event
         deployment_context = event.get('deploymentContext', {})
@@ -19,31 +98,59 @@ def lambda_handler(event, context):
         # Danh sách các services cần kiểm tra
         services = ['auth-service', 'menu-service', 'order-service', 'payment-service']
         
-        # Khởi tạo AWS clients
-        ecs_client = boto3.client('ecs')
-        ec2_client = boto3.client('ec2')
+        # Lấy trạng thái ECS của tất cả services bằng một lần describe_services cho mỗi cluster
+        service_descriptions = prefetch_service_descriptions(ecs_client, services)
+        
+        # Lấy task IPs của tất cả services: list_tasks, describe_tasks và EC2 mỗi loại một lượt cho mỗi cluster
+        service_task_ips = prefetch_service_task_ips(ecs_client, ec2_client, services)
         
         # Kiểm tra health của tất cả services song song
         health_results = {}
         
-        with ThreadPoolExecutor(max_workers=4) as executor:
+        # Không dùng with: khi quá thời gian thì trả kết quả ngay, không chờ các threads bị treo.
+        # Executor riêng cho mỗi invocation để check bị treo không chiếm worker của invocation sau
+        executor = ThreadPoolExecutor(max_workers=len(SERVICE_CONFIG))
+        try:
             future_to_service = {
-                executor.submit(check_service_health, ecs_client, ec2_client, service): service
+                executor.submit(
+                    check_service_health,
+                    ecs_client,
+                    ec2_client,
+                    service,
+                    service_descriptions.get(service),
+                    service_task_ips.get(service),
+                    check_time
+                ): service
                 for service in services
             }
             
-            for future in as_completed(future_to_service):
-                service = future_to_service[future]
-                try:
-                    health_result = future.result()
-                    health_results[service] = health_result
-                except Exception as e:
-                    print(f"Error checking {service}: {str(e)}")
-                    health_results[service] = {
-                        'healthy': False,
-                        'error': str(e),
-                        'check_time': datetime.now(timezone.utc).isoformat()
-                    }
+            try:
+                for future in as_completed(future_to_service, timeout=SERVICE_CHECK_TIMEOUT):
+                    service = future_to_service[future]
+                    try:
+                        health_result = future.result()
+                        health_results[service] = health_result
+                    except Exception as e:
+                        print(f"Error checking {service}: {str(e)}")
+                        health_results[service] = {
+                            'healthy': False,
+                            'error': str(e),
+                            'check_time': check_time
+                        }
+            except FuturesTimeoutError:
+                # Services chưa xong trong thời gian cho phép được đánh dấu unhealthy
+                for future, service in future_to_service.items():
+                    if service not in health_results:
+                        # Check chưa bắt đầu thì bị huỷ; check đang chạy tự kết thúc theo timeout của HTTP/AWS calls
+                        future.cancel()
+                        print(f"Health check for {service} timed out after {SERVICE_CHECK_TIMEOUT}s")
+                        health_results[service] = {
+                            'healthy': False,
+                            'error': 'check_timeout',
+                            'check_time': check_time
+                        }
+        finally:
+            executor.shutdown(wait=False)
         
         # Kiểm tra inter-service connectivity
         connectivity_results = check_inter_service_connectivity(health_results)
@@ -61,7 +168,7 @@ def lambda_handler(event, context):
             'connectivity_check': connectivity_results,
             'summary': overall_assessment['summary'],
             'recommendations': overall_assessment['recommendations'],
-            'check_time': datetime.now(timezone.utc).isoformat(),
+            'check_time': check_time,
             'message': f'Final health check completed: {overall_assessment["status"]}'
         }
         
@@ -79,28 +186,28 @@ def lambda_handler(event, context):
             'deployment_id': deployment_context.get('deployment_id') if deployment_context else None,
             'overall_status': 'unhealthy',
             'error': error_message,
-            'check_time': datetime.now(timezone.utc).isoformat(),
+            'check_time': check_time,
             'message': 'Final health check failed'
         }
 
-def check_service_health(ecs_client, ec2_client, service_name):
+def check_service_health(ecs_client, ec2_client, service_name, service_description=None, task_ips=None, check_time=None):
     """Kiểm tra health của một service cụ thể"""
+    if check_time is None:
+        check_time = datetime.now(timezone.utc).isoformat()
+    
     try:
         service_config = get_service_config(service_name)
         
-        # 1. Kiểm tra ECS service status
-        ecs_status = check_ecs_service_status(ecs_client, service_config)
+        # 1. Kiểm tra ECS service status (dùng kết quả describe đã prefetch nếu có)
+        ecs_status = check_ecs_service_status(ecs_client, service_config, service_description)
         
-        # 2. Lấy task IPs
-        task_arns = get_running_tasks(ecs_client, service_config)
-        task_ips = get_task_ips(ecs_client, ec2_client, service_config, task_arns)
+        # 2. Lấy task IPs (nếu chưa được prefetch)
+        if task_ips is None:
+            task_arns = get_running_tasks(ecs_client, service_config)
+            task_ips = get_task_ips(ecs_client, ec2_client, service_config, task_arns)
         
-        # 3. Kiểm tra health endpoints
-        endpoint_results = []
-        if task_ips:
-            for ip in task_ips:
-                endpoint_result = check_health_endpoint(ip, service_config)
-                endpoint_results.append(endpoint_result)
+        # 3. Kiểm tra health endpoints (song song, giữ thứ tự theo task_ips)
+        endpoint_results = probe_health_endpoints(task_ips, service_config) if task_ips else []
         
         # 4. Đánh giá tổng thể cho service này
         healthy_endpoints = sum(1 for result in endpoint_results if result.get('healthy', False))
@@ -121,90 +228,76 @@ def check_service_health(ecs_client, ec2_client, service_name):
                 'details': endpoint_results
             },
             'task_ips': task_ips,
-            'check_time': datetime.now(timezone.utc).isoformat()
+            'check_time': check_time
         }
         
     except Exception as e:
         return {
             'healthy': False,
             'error': str(e),
-            'check_time': datetime.now(timezone.utc).isoformat()
+            'check_time': check_time
         }
 
 def check_inter_service_connectivity(health_results):
     """Kiểm tra connectivity giữa các services"""
-    connectivity_tests = [
-        {
-            'from': 'menu-service',
-            'to': 'auth-service',
-            'endpoint': '/validate-token',
-            'description': 'Menu service -> Auth service token validation'
-        },
-        {
-            'from': 'order-service',
-            'to': 'auth-service',
-            'endpoint': '/validate-token',
-            'description': 'Order service -> Auth service token validation'
-        },
-        {
-            'from': 'order-service',
-            'to': 'menu-service',
-            'endpoint': '/menu/items',
-            'description': 'Order service -> Menu service item lookup'
-        },
-        {
-            'from': 'order-service',
-            'to': 'payment-service',
-            'endpoint': '/payment/process',
-            'description': 'Order service -> Payment service payment processing'
-        }
-    ]
+    # Các test độc lập nhau nên chạy song song; kết quả giữ thứ tự của CONNECTIVITY_TESTS
+    connectivity_results = [None] * len(CONNECTIVITY_TESTS)
+    
+    # Tra cứu health và IPs của các services một lần cho mọi tests
+    healthy_services = {name for name, result in health_results.items() if result.get('healthy', False)}
+    service_ips = {name: result.get('task_ips', []) for name, result in health_results.items()}
     
-    connectivity_results = []
+    future_to_test = {}
     
-    for test in connectivity_tests:
+    for index, test in enumerate(CONNECTIVITY_TESTS):
         from_service = test['from']
         to_service = test['to']
         
         # Kiểm tra cả hai services có healthy không
-        from_healthy = health_results.get(from_service, {}).get('healthy', False)
-        to_healthy = health_results.get(to_service, {}).get('healthy', False)
+        from_healthy = from_service in healthy_services
+        to_healthy = to_service in healthy_services
         
         if not from_healthy or not to_healthy:
-            connectivity_results.append({
+            connectivity_results[index] = {
                 'test': test['description'],
                 'status': 'skipped',
                 'reason': f'Source or target service not healthy ({from_service}: {from_healthy}, {to_service}: {to_healthy})'
-            })
+            }
             continue
         
         # Lấy IP của target service
-        to_ips = health_results.get(to_service, {}).get('task_ips', [])
+        to_ips = service_ips.get(to_service)
         if not to_ips:
-            connectivity_results.append({
+            connectivity_results[index] = {
                 'test': test['description'],
                 'status': 'failed',
                 'reason': f'No IPs found for {to_service}'
-            })
+            }
             continue
         
         # Test connectivity với IP đầu tiên của target service
         target_ip = to_ips[0]
         to_service_config = get_service_config(to_service)
         
-        connectivity_test_result = test_service_connectivity(
+        future = connectivity_executor.submit(
+            test_service_connectivity,
             target_ip, 
             to_service_config['port'], 
             test['endpoint']
         )
+        future_to_test[future] = (index, test, target_ip)
+    
+    for future in as_completed(future_to_test):
+        index, test, target_ip = future_to_test[future]
+        connectivity_test_result = future.result()
         
-        connectivity_results.append({
+        connectivity_results[index] = {
             'test': test['description'],
             'status': 'success' if connectivity_test_result['connected'] else 'failed',
             'target_ip': target_ip,
             'response_time': connectivity_test_result.get('response_time'),
             'details': connectivity_test_result
-        })
+        }
     
     return connectivity_results
 
@@ -214,23 +307,30 @@ def test_service_connectivity(ip, port, endpoint, timeout=5):
         url = f"http://{ip}:{port}{endpoint}"
         
         start_time = time.time()
-        response = requests.get(url, timeout=timeout)
+        response = http_pool.request('GET', url, timeout=timeout)
         response_time = time.time() - start_time
         
         return {
             'connected': True,
-            'status_code': response.status_code,
+            'status_code': response.status,
             'response_time': response_time,
             'url': url
         }
         
-    except requests.exceptions.Timeout:
+    except NewConnectionError:
+        # NewConnectionError kế thừa ConnectTimeoutError nên phải bắt trước HTTPTimeoutError
+        return {
+            'connected': False,
+            'error': 'connection_refused',
+            'url': url
+        }
+    except HTTPTimeoutError:
         return {
             'connected': False,
             'error': 'timeout',
             'url': url
         }
-    except requests.exceptions.ConnectionError:
+    except ProtocolError:
         return {
             'connected': False,
             'error': 'connection_refused',
@@ -246,11 +346,26 @@ def test_service_connectivity(ip, port, endpoint, timeout=5):
 def evaluate_overall_health(health_results, connectivity_results):
     """Đánh giá tổng thể health của deployment"""
     total_services = len(health_results)
-    healthy_services = sum(1 for result in health_results.values() if result.get('healthy', False))
     
-    # Đếm connectivity tests thành công
+    # Một lượt qua health results: đếm healthy và ghi nhận services cần kiểm tra
+    healthy_services = 0
+    unhealthy_services = []
+    for service, result in health_results.items():
+        if result.get('healthy', False):
+            healthy_services += 1
+        else:
+            unhealthy_services.append(service)
+    
+    # Một lượt qua connectivity results: đếm thành công và thất bại
     connectivity_tests = len(connectivity_results)
-    successful_connectivity = sum(1 for result in connectivity_results if result['status'] == 'success')
+    successful_connectivity = 0
+    failed_connectivity = 0
+    for result in connectivity_results:
+        status = result['status']
+        if status == 'success':
+            successful_connectivity += 1
+        elif status == 'failed':
+            failed_connectivity += 1
     
     # Xác định overall status
     if healthy_services == total_services and successful_connectivity >= (connectivity_tests * 0.7):
@@ -264,15 +379,13 @@ def evaluate_overall_health(health_results, connectivity_results):
     summary = f"{healthy_services}/{total_services} services healthy, {successful_connectivity}/{connectivity_tests} connectivity tests passed"
     
     # Tạo recommendations
-    recommendations = []
-    
-    for service, result in health_results.items():
-        if not result.get('healthy', False):
-            recommendations.append(f"Investigate {service} - not responding to health checks")
+    recommendations = [
+        f"Investigate {service} - not responding to health checks"
+        for service in unhealthy_services
+    ]
     
-    failed_connectivity = [test for test in connectivity_results if test['status'] == 'failed']
     if failed_connectivity:
-        recommendations.append(f"Check network connectivity - {len(failed_connectivity)} inter-service connections failed")
+        recommendations.append(f"Check network connectivity - {failed_connectivity} inter-service connections failed")
     
     if not recommendations:
         recommendations.append("All services and connectivity checks passed")
@@ -288,48 +401,47 @@ def evaluate_overall_health(health_results, connectivity_results):
 
 def get_service_config(service_name):
     """Lấy cấu hình cho service"""
-    base_config = {
-        'auth-service': {
-            'cluster_name': 'restaurant-staging',
-            'service_name': 'auth-service-staging',
-            'port': 8080,
-            'health_path': '/health'
-        },
-        'menu-service': {
-            'cluster_name': 'restaurant-staging',
-            'service_name': 'menu-service-staging',
-            'port': 8081,
-            'health_path': '/health'
-        },
-        'order-service': {
-            'cluster_name': 'restaurant-staging',
-            'service_name': 'order-service-staging',
-            'port': 8082,
-            'health_path': '/health'
-        },
-        'payment-service': {
-            'cluster_name': 'restaurant-staging',
-            'service_name': 'payment-service-staging',
-            'port': 8083,
-            'health_path': '/health'
-        }
-    }
+    return SERVICE_CONFIG.get(service_name, {})
+
+def prefetch_service_descriptions(ecs_client, services):
+    """Describe các services theo từng cluster (tối đa 10 services mỗi request). Trả về dict theo tên service ngắn"""
+    services_by_cluster = {}
+    for service_name in services:
+        service_config = get_service_config(service_name)
+        if service_config:
+            services_by_cluster.setdefault(service_config['cluster_name'], {})[service_config['service_name']] = service_name
+    
+    service_descriptions = {}
+    for cluster_name, name_map in services_by_cluster.items():
+        service_names = list(name_map)
+        for start in range(0, len(service_names), 10):
+            try:
+                response = ecs_client.describe_services(
+                    cluster=cluster_name,
+                    services=service_names[start:start + 10]
+                )
+            except Exception as e:
+                print(f"Error describing services in {cluster_name}: {str(e)}")
+                continue
+            
+            for service in response['services']:
+                service_descriptions[name_map[service['serviceName']]] = service
     
-    return base_config.get(service_name, {})
+    return service_descriptions
 
-# Reuse helper functions from health_checker.py
-def check_ecs_service_status(ecs_client, service_config):
+def check_ecs_service_status(ecs_client, service_config, service=None):
     """Kiểm tra trạng thái ECS service"""
     try:
-        response = ecs_client.describe_services(
-            cluster=service_config['cluster_name'],
-            services=[service_config['service_name']]
-        )
-        
-        if not response['services']:
-            return {'healthy': False, 'reason': 'Service not found'}
-        
-        service = response['services'][0]
+        if service is None:
+            response = ecs_client.describe_services(
+                cluster=service_config['cluster_name'],
+                services=[service_config['service_name']]
+            )
+            
+            if not response['services']:
+                return {'healthy': False, 'reason': 'Service not found'}
+            
+            service = response['services'][0]
         
         if service['status'] != 'ACTIVE':
             return {'healthy': False, 'reason': f"Service status: {service['status']}"}
@@ -357,12 +469,18 @@ def check_ecs_service_status(ecs_client, service_config):
 def get_running_tasks(ecs_client, service_config):
     """Lấy danh sách tasks đang chạy"""
     try:
-        response = ecs_client.list_tasks(
+        # list_tasks trả tối đa 100 ARNs mỗi trang, paginator lấy hết các trang
+        task_arns = []
+        for page in ecs_client.get_paginator('list_tasks').paginate(
             cluster=service_config['cluster_name'],
             serviceName=service_config['service_name'],
-            desiredStatus='RUNNING'
-        )
-        return response['taskArns']
+            desiredStatus='RUNNING',
+            PaginationConfig={'PageSize': 100}
+        ):
+            task_arns.extend(page['taskArns'])
+        
+        return task_arns
+        
     except Exception as e:
         print(f"Error getting running tasks: {str(e)}")
         return []
@@ -373,56 +491,142 @@ def get_task_ips(ecs_client, ec2_client, service_config, task_arns):
         if not task_arns:
             return []
         
-        response = ecs_client.describe_tasks(
-            cluster=service_config['cluster_name'],
-            tasks=task_arns
-        )
+        # describe_tasks nhận tối đa 100 tasks mỗi request
+        tasks = []
+        for start in range(0, len(task_arns), 100):
+            response = ecs_client.describe_tasks(
+                cluster=service_config['cluster_name'],
+                tasks=task_arns[start:start + 100]
+            )
+            tasks.extend(response['tasks'])
+        
+        # Gom ENI IDs của tất cả tasks để lấy IP bằng một lần describe_network_interfaces
+        eni_ids = get_task_eni_ids(tasks)
+        eni_ips = get_eni_ips(ec2_client, eni_ids)
+        
+        return [eni_ips[eni_id] for eni_id in eni_ids if eni_id in eni_ips]
         
-        task_ips = []
-        for task in response['tasks']:
-            for attachment in task.get('attachments', []):
-                if attachment['type'] == 'ElasticNetworkInterface':
-                    for detail in attachment['details']:
-                        if detail['name'] == 'networkInterfaceId':
-                            eni_id = detail['value']
-                            
-                            eni_response = ec2_client.describe_network_interfaces(
-                                NetworkInterfaceIds=[eni_id]
-                            )
-                            
-                            if eni_response['NetworkInterfaces']:
-                                eni = eni_response['NetworkInterfaces'][0]
-                                
-                                if 'Association' in eni and 'PublicIp' in eni['Association']:
-                                    task_ips.append(eni['Association']['PublicIp'])
-                                elif 'PrivateIpAddress' in eni:
-                                    task_ips.append(eni['PrivateIpAddress'])
-        
-        return task_ips
     except Exception as e:
         print(f"Error getting task IPs: {str(e)}")
         return []
 
+def prefetch_service_task_ips(ecs_client, ec2_client, services):
+    """Task IPs của các services, lấy theo cluster thay vì theo từng service. Trả về dict theo tên service ngắn"""
+    services_by_cluster = {}
+    for service_name in services:
+        service_config = get_service_config(service_name)
+        if service_config:
+            services_by_cluster.setdefault(service_config['cluster_name'], {})[service_config['service_name']] = service_name
+    
+    service_task_ips = {}
+    for cluster_name, name_map in services_by_cluster.items():
+        try:
+            task_arns = []
+            for page in ecs_client.get_paginator('list_tasks').paginate(cluster=cluster_name, desiredStatus='RUNNING'):
+                task_arns.extend(page['taskArns'])
+            
+            # describe_tasks nhận tối đa 100 tasks mỗi request
+            tasks = []
+            for start in range(0, len(task_arns), 100):
+                tasks.extend(ecs_client.describe_tasks(cluster=cluster_name, tasks=task_arns[start:start + 100])['tasks'])
+            
+            eni_ips = get_eni_ips(ec2_client, get_task_eni_ids(tasks))
+            
+        except Exception as e:
+            print(f"Error getting task IPs in {cluster_name}: {str(e)}")
+            continue
+        
+        for service_name in name_map.values():
+            service_task_ips[service_name] = []
+        
+        # Task của ECS service có group dạng "service:<service name>"
+        for task in tasks:
+            group = task.get('group', '')
+            service_name = name_map.get(group[len('service:'):]) if group.startswith('service:') else None
+            if service_name is None:
+                continue
+            
+            for eni_id in get_task_eni_ids([task]):
+                if eni_id in eni_ips:
+                    service_task_ips[service_name].append(eni_ips[eni_id])
+    
+    return service_task_ips
+
+def get_eni_ips(ec2_client, eni_ids):
+    """IP của từng ENI (ưu tiên public IP, fallback về private IP), lấy theo lô 100 ENIs mỗi request"""
+    eni_ips = {}
+    
+    for start in range(0, len(eni_ids), 100):
+        response = ec2_client.describe_network_interfaces(
+            NetworkInterfaceIds=eni_ids[start:start + 100]
+        )
+        
+        for eni in response['NetworkInterfaces']:
+            if 'Association' in eni and 'PublicIp' in eni['Association']:
+                eni_ips[eni['NetworkInterfaceId']] = eni['Association']['PublicIp']
+            elif 'PrivateIpAddress' in eni:
+                eni_ips[eni['NetworkInterfaceId']] = eni['PrivateIpAddress']
+    
+    return eni_ips
+
+def get_task_eni_ids(tasks):
+    """ENI IDs của các tasks, theo thứ tự tasks"""
+    eni_ids = []
+    for task in tasks:
+        # Lấy ENI ID từ task
+        for attachment in task.get('attachments', []):
+            if attachment['type'] == 'ElasticNetworkInterface':
+                for detail in attachment['details']:
+                    if detail['name'] == 'networkInterfaceId':
+                        eni_ids.append(detail['value'])
+    return eni_ids
+
+def probe_health_endpoints(task_ips, service_config):
+    """Probe health endpoint của tất cả tasks cùng lúc - wall time bằng probe chậm nhất thay vì tổng các probe"""
+    with ThreadPoolExecutor(max_workers=min(len(task_ips), 16)) as executor:
+        return list(executor.map(lambda ip: check_health_endpoint(ip, service_config), task_ips))
+
+def probe_url(url, timeout):
+    """
+    Probe health endpoint và trả về status code, không tải response body.
+    Dùng HEAD; nếu endpoint không hỗ trợ HEAD thì fallback về GET stream và đóng ngay sau khi nhận headers.
+    Cả hai requests dùng chung timeout ban đầu.
+    """
+    deadline = time.monotonic() + timeout
+    
+    response = http_pool.request('HEAD', url, timeout=timeout, redirect=False)
+    if response.status not in (405, 501):
+        return response.status
+    
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise HTTPTimeoutError(f'Health check timed out after {timeout}s')
+    
+    response = http_pool.request('GET', url, timeout=remaining, redirect=False, preload_content=False)
+    response.close()
+    return response.status
+
 def check_health_endpoint(ip_address, service_config, timeout=5):
     """Kiểm tra health endpoint của một task"""
     health_url = f"http://{ip_address}:{service_config['port']}{service_config['health_path']}"
     
     try:
-        response = requests.get(health_url, timeout=timeout)
+        start_time = time.monotonic()
+        status_code = probe_url(health_url, timeout)
         
-        if response.status_code == 200:
+        if status_code == 200:
             return {
                 'ip': ip_address,
                 'healthy': True,
-                'status_code': response.status_code,
-                'response_time': response.elapsed.total_seconds()
+                'status_code': status_code,
+                'response_time': time.monotonic() - start_time
             }
         else:
             return {
                 'ip': ip_address,
                 'healthy': False,
-                'status_code': response.status_code,
-                'reason': f'HTTP {response.status_code}'
+                'status_code': status_code,
+                'reason': f'HTTP {status_code}'
             }
             
     except Exception as e:
@@ -1,13 +1,62 @@
 import json
 import boto3
+import random
 import requests
 import time
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from requests.adapters import HTTPAdapter
+
+# Khởi tạo AWS clients một lần cho mỗi container, dùng lại giữa các warm invocations.
+# Pool lớn hơn mặc định (10) để các describe calls song song không phải chờ connection
+AWS_CLIENT_CONFIG = Config(max_pool_connections=32, retries={'max_attempts': 2, 'mode': 'standard'})
+ecs_client = boto3.client('ecs', config=AWS_CLIENT_CONFIG)
+ec2_client = boto3.client('ec2', config=AWS_CLIENT_CONFIG)
+
+# HTTP session dùng chung cho cả container: giữ kết nối keep-alive tới các tasks giữa các lần probe
+http_session = requests.Session()
+http_session.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+
+# Cache IPs theo task ARN giữa các warm invocations: task_arn -> (ips, expiry theo time.monotonic())
+TASK_IP_CACHE = {}
+TASK_IP_CACHE_TTL = 60
+
+# Cấu hình tĩnh của các services, dựng một lần khi load module
+SERVICE_CONFIG = {
+    'auth-service': {
+        'cluster_name': 'restaurant-staging',
+        'service_name': 'auth-service-staging',
+        'port': 8080,
+        'health_path': '/health'
+    },
+    'menu-service': {
+        'cluster_name': 'restaurant-staging',
+        'service_name': 'menu-service-staging',
+        'port': 8081,
+        'health_path': '/health'
+    },
+    'order-service': {
+        'cluster_name': 'restaurant-staging',
+        'service_name': 'order-service-staging',
+        'port': 8082,
+        'health_path': '/health'
+    },
+    'payment-service': {
+        'cluster_name': 'restaurant-staging',
+        'service_name': 'payment-service-staging',
+        'port': 8083,
+        'health_path': '/health'
+    }
+}
 
 def lambda_handler(event, context):
     """
     Lambda function để kiểm tra health của microservice
     """
+    # Thời điểm kiểm tra, dùng chung cho mọi kết quả của invocation
+    check_time = datetime.now(timezone.utc).isoformat()
+    
     try:
         # Lấy thông tin từ event
         service_name = event.get('service_name')
@@ -22,33 +71,26 @@ def lambda_handler(event, context):
         service_arn = deployment_result.get('service_arn')
         deployment_id = deployment_result.get('deployment_id')
         
-        # Khởi tạo AWS clients
-        ecs_client = boto3.client('ecs')
-        ec2_client = boto3.client('ec2')
-        
         # Lấy cấu hình service
         service_config = get_service_config(service_name)
         
         # 1. Kiểm tra ECS service status
         ecs_status = check_ecs_service_status(ecs_client, service_config)
         if not ecs_status['healthy']:
-            return create_unhealthy_response(service_name, "ECS service not stable", ecs_status)
+            return create_unhealthy_response(service_name, "ECS service not stable", ecs_status, check_time)
         
         # 2. Lấy danh sách tasks đang chạy
         task_arns = get_running_tasks(ecs_client, service_config)
         if not task_arns:
-            return create_unhealthy_response(service_name, "No running tasks found", {})
+            return create_unhealthy_response(service_name, "No running tasks found", {}, check_time)
         
         # 3. Lấy IP addresses của các tasks
         task_ips = get_task_ips(ecs_client, ec2_client, service_config, task_arns)
         if not task_ips:
-            return create_unhealthy_response(service_name, "No task IPs found", {})
+            return create_unhealthy_response(service_name, "No task IPs found", {}, check_time)
         
-        # 4. Kiểm tra health endpoint của từng task
-        health_results = []
-        for task_ip in task_ips:
-            health_result = check_health_endpoint(task_ip, service_config)
-            health_results.append(health_result)
+        # 4. Kiểm tra health endpoint của từng task (song song, giữ thứ tự theo task_ips)
+        health_results = probe_health_endpoints(task_ips, service_config)
         
         # 5. Đánh giá tổng thể
         healthy_count = sum(1 for result in health_results if result['healthy'])
@@ -66,7 +108,7 @@ def lambda_handler(event, context):
             'total_tasks': total_count,
             'health_details': health_results,
             'ecs_status': ecs_status,
-            'check_time': datetime.now(timezone.utc).isoformat(),
+            'check_time': check_time,
             'message': f'Health check completed for {service_name}'
         }
         
@@ -82,43 +124,16 @@ def lambda_handler(event, context):
             'service_name': service_name,
             'status': 'unhealthy',
             'error': error_message,
-            'check_time': datetime.now(timezone.utc).isoformat(),
+            'check_time': check_time,
             'message': f'Health check failed for {service_name}'
         }
 
 def get_service_config(service_name):
     """Lấy cấu hình cho service"""
-    base_config = {
-        'auth-service': {
-            'cluster_name': 'restaurant-staging',
-            'service_name': 'auth-service-staging',
-            'port': 8080,
-            'health_path': '/health'
-        },
-        'menu-service': {
-            'cluster_name': 'restaurant-staging',
-            'service_name': 'menu-service-staging',
-            'port': 8081,
-            'health_path': '/health'
-        },
-        'order-service': {
-            'cluster_name': 'restaurant-staging',
-            'service_name': 'order-service-staging',
-            'port': 8082,
-            'health_path': '/health'
-        },
-        'payment-service': {
-            'cluster_name': 'restaurant-staging',
-            'service_name': 'payment-service-staging',
-            'port': 8083,
-            'health_path': '/health'
-        }
-    }
-    
-    if service_name not in base_config:
+    if service_name not in SERVICE_CONFIG:
         raise ValueError(f"Unknown service: {service_name}")
     
-    return base_config[service_name]
+    return SERVICE_CONFIG[service_name]
 
 def check_ecs_service_status(ecs_client, service_config):
     """Kiểm tra trạng thái ECS service"""
@@ -172,13 +187,17 @@ def check_ecs_service_status(ecs_client, service_config):
 def get_running_tasks(ecs_client, service_config):
     """Lấy danh sách tasks đang chạy"""
     try:
-        response = ecs_client.list_tasks(
+        # list_tasks trả tối đa 100 ARNs mỗi trang, paginator lấy hết các trang
+        task_arns = []
+        for page in ecs_client.get_paginator('list_tasks').paginate(
             cluster=service_config['cluster_name'],
             serviceName=service_config['service_name'],
-            desiredStatus='RUNNING'
-        )
+            desiredStatus='RUNNING',
+            PaginationConfig={'PageSize': 100}
+        ):
+            task_arns.extend(page['taskArns'])
         
-        return response['taskArns']
+        return task_arns
         
     except Exception as e:
         print(f"Error getting running tasks: {str(e)}")
@@ -190,35 +209,21 @@ def get_task_ips(ecs_client, ec2_client, service_config, task_arns):
         if not task_arns:
             return []
         
-        # Lấy thông tin chi tiết của tasks
-        response = ecs_client.describe_tasks(
-            cluster=service_config['cluster_name'],
-            tasks=task_arns
-        )
+        # Bỏ các entries đã hết hạn: task ARNs đổi sau mỗi deployment nên cache không được giữ mãi
+        now = time.monotonic()
+        for task_arn in [arn for arn, (_, expiry) in TASK_IP_CACHE.items() if expiry <= now]:
+            del TASK_IP_CACHE[task_arn]
         
-        task_ips = []
+        # IP của task không đổi trong suốt vòng đời task: chỉ describe các tasks chưa có trong cache
+        missing_arns = [task_arn for task_arn in task_arns if task_arn not in TASK_IP_CACHE]
+        if missing_arns:
+            cache_task_ips(ecs_client, ec2_client, service_config, missing_arns, now + TASK_IP_CACHE_TTL)
         
-        for task in response['tasks']:
-            # Lấy ENI ID từ task
-            for attachment in task.get('attachments', []):
-                if attachment['type'] == 'ElasticNetworkInterface':
-                    for detail in attachment['details']:
-                        if detail['name'] == 'networkInterfaceId':
-                            eni_id = detail['value']
-                            
-                            # Lấy public IP từ ENI
-                            eni_response = ec2_client.describe_network_interfaces(
-                                NetworkInterfaceIds=[eni_id]
-                            )
-                            
-                            if eni_response['NetworkInterfaces']:
-                                eni = eni_response['NetworkInterfaces'][0]
-                                
-                                # Ưu tiên public IP, fallback về private IP
-                                if 'Association' in eni and 'PublicIp' in eni['Association']:
-                                    task_ips.append(eni['Association']['PublicIp'])
-                                elif 'PrivateIpAddress' in eni:
-                                    task_ips.append(eni['PrivateIpAddress'])
+        task_ips = []
+        for task_arn in task_arns:
+            cached = TASK_IP_CACHE.get(task_arn)
+            if cached:
+                task_ips.extend(cached[0])
         
         return task_ips
         
@@ -226,6 +231,66 @@ def get_task_ips(ecs_client, ec2_client, service_config, task_arns):
         print(f"Error getting task IPs: {str(e)}")
         return []
 
+def cache_task_ips(ecs_client, ec2_client, service_config, task_arns, expiry):
+    """Describe tasks + ENIs và lưu IPs của từng task vào TASK_IP_CACHE"""
+    # Lấy thông tin chi tiết của tasks (describe_tasks nhận tối đa 100 tasks mỗi request)
+    tasks = []
+    for start in range(0, len(task_arns), 100):
+        response = ecs_client.describe_tasks(
+            cluster=service_config['cluster_name'],
+            tasks=task_arns[start:start + 100]
+        )
+        tasks.extend(response['tasks'])
+    
+    # Gom ENI IDs của tất cả tasks để lấy IP bằng một lần describe_network_interfaces
+    eni_ids_by_task = {task['taskArn']: get_task_eni_ids([task]) for task in tasks}
+    eni_ids = [eni_id for task_eni_ids in eni_ids_by_task.values() for eni_id in task_eni_ids]
+    if not eni_ids:
+        return
+    
+    eni_response = ec2_client.describe_network_interfaces(
+        NetworkInterfaceIds=eni_ids
+    )
+    enis_by_id = {eni['NetworkInterfaceId']: eni for eni in eni_response['NetworkInterfaces']}
+    
+    for task_arn, task_eni_ids in eni_ids_by_task.items():
+        ips = []
+        for eni_id in task_eni_ids:
+            eni = enis_by_id.get(eni_id)
+            if not eni:
+                continue
+            
+            # Ưu tiên public IP, fallback về private IP
+            if 'Association' in eni and 'PublicIp' in eni['Association']:
+                ips.append(eni['Association']['PublicIp'])
+            elif 'PrivateIpAddress' in eni:
+                ips.append(eni['PrivateIpAddress'])
+        
+        # Task chưa có IP (đang provisioning) không được cache để lần sau describe lại
+        if ips:
+            TASK_IP_CACHE[task_arn] = (ips, expiry)
+
+def get_task_eni_ids(tasks):
+    """ENI IDs của các tasks, theo thứ tự tasks"""
+    eni_ids = []
+    for task in tasks:
+        # Lấy ENI ID từ task
+        for attachment in task.get('attachments', []):
+            if attachment['type'] == 'ElasticNetworkInterface':
+                for detail in attachment['details']:
+                    if detail['name'] == 'networkInterfaceId':
+                        eni_ids.append(detail['value'])
+    return eni_ids
+
+def probe_health_endpoints(task_ips, service_config):
+    """Probe health endpoint của tất cả tasks cùng lúc - wall time bằng probe chậm nhất thay vì tổng các probe"""
+    with ThreadPoolExecutor(max_workers=min(len(task_ips), 16)) as executor:
+        return list(executor.map(lambda task_ip: check_health_endpoint(task_ip, service_config), task_ips))
+
+def retry_delay(attempt):
+    """Thời gian chờ trước lần retry tiếp theo: exponential backoff (0.2s, 0.4s, ...) cộng jitter"""
+    return 0.2 * (2 ** attempt) + random.uniform(0, 0.1)
+
 def check_health_endpoint(ip_address, service_config, timeout=10, retries=3):
     """Kiểm tra health endpoint của một task"""
     health_url = f"http://{ip_address}:{service_config['port']}{service_config['health_path']}"
@@ -234,12 +299,13 @@ def check_health_endpoint(ip_address, service_config, timeout=10, retries=3):
         try:
             print(f"Checking health endpoint: {health_url} (attempt {attempt + 1})")
             
-            response = requests.get(health_url, timeout=timeout)
+            response = http_session.get(health_url, timeout=timeout)
             
             if response.status_code == 200:
-                # Kiểm tra response content nếu có
+                # Kiểm tra response content nếu có.
+                # json.loads nhận thẳng bytes (tự nhận UTF-8/16/32), bỏ qua bước đoán charset của response.json()
                 try:
-                    health_data = response.json()
+                    health_data = json.loads(response.content)
                     if health_data.get('status') == 'healthy':
                         return {
                             'ip': ip_address,
@@ -268,31 +334,29 @@ def check_health_endpoint(ip_address, service_config, timeout=10, retries=3):
             }
             
         except requests.exceptions.Timeout:
+            # Chỉ timeout mới đáng retry (task có thể đang bận); backoff tăng dần + jitter
             if attempt == retries - 1:  # Last attempt
                 return {
                     'ip': ip_address,
                     'healthy': False,
                     'reason': f'Timeout after {timeout}s'
                 }
-            time.sleep(2)  # Wait before retry
+            time.sleep(retry_delay(attempt))
             
         except requests.exceptions.ConnectionError:
-            if attempt == retries - 1:  # Last attempt
-                return {
-                    'ip': ip_address,
-                    'healthy': False,
-                    'reason': 'Connection refused'
-                }
-            time.sleep(2)  # Wait before retry
+            # Target không nhận kết nối - retry sau vài giây cũng không khác, fail ngay
+            return {
+                'ip': ip_address,
+                'healthy': False,
+                'reason': 'Connection refused'
+            }
             
         except Exception as e:
-            if attempt == retries - 1:  # Last attempt
-                return {
-                    'ip': ip_address,
-                    'healthy': False,
-                    'reason': f'Request error: {str(e)}'
-                }
-            time.sleep(2)  # Wait before retry
+            return {
+                'ip': ip_address,
+                'healthy': False,
+                'reason': f'Request error: {str(e)}'
+            }
     
     return {
         'ip': ip_address,
@@ -300,14 +364,17 @@ def check_health_endpoint(ip_address, service_config, timeout=10, retries=3):
         'reason': 'All retry attempts failed'
     }
 
-def create_unhealthy_response(service_name, reason, details):
+def create_unhealthy_response(service_name, reason, details, check_time=None):
     """Tạo response cho trường hợp unhealthy"""
+    if check_time is None:
+        check_time = datetime.now(timezone.utc).isoformat()
+    
     return {
         'statusCode': 200,
         'service_name': service_name,
         'status': 'unhealthy',
         'reason': reason,
         'details': details,
-        'check_time': datetime.now(timezone.utc).isoformat(),
+        'check_time': check_time,
         'message': f'Health check failed for {service_name}: {reason}'
     } 
\ No newline at end of file
@@ -1,9 +1,56 @@
 import json
 import boto3
-import time
+from botocore.config import Config
+from botocore.exceptions import WaiterError
 from datetime import datetime, timezone
 import os
 
+# Khởi tạo AWS clients một lần cho mỗi container, dùng lại giữa các warm invocations.
+# TCP keep-alive giữ kết nối sống giữa các lần poll của waiter và giữa các invocations
+AWS_CLIENT_CONFIG = Config(
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=30,
+    retries={'max_attempts': 5, 'mode': 'standard'}
+)
+ecs_client = boto3.client('ecs', config=AWS_CLIENT_CONFIG)
+ecr_client = boto3.client('ecr', config=AWS_CLIENT_CONFIG)
+
+# Registry ID theo repository, không đổi trong suốt vòng đời container
+REGISTRY_ID_CACHE = {}
+
+# Phần cấu hình không phụ thuộc environment của các services, dựng một lần khi load module
+SERVICE_TEMPLATES = {
+    'auth-service': {
+        'repository_name': 'restaurant/auth-service',
+        'port': 8080,
+        'cpu': 256,
+        'memory': 512,
+        'desired_count': 2
+    },
+    'menu-service': {
+        'repository_name': 'restaurant/menu-service',
+        'port': 8081,
+        'cpu': 256,
+        'memory': 512,
+        'desired_count': 2
+    },
+    'order-service': {
+        'repository_name': 'restaurant/order-service',
+        'port': 8082,
+        'cpu': 512,
+        'memory': 1024,
+        'desired_count': 3
+    },
+    'payment-service': {
+        'repository_name': 'restaurant/payment-service',
+        'port': 8083,
+        'cpu': 256,
+        'memory': 512,
+        'desired_count': 2
+    }
+}
+
 def lambda_handler(event, context):
     """
     Lambda function để deploy microservice
@@ -22,10 +69,6 @@ def lambda_handler(event, context):
         
         print(f"Deploying {service_name} for deployment {deployment_id}")
         
-        # Khởi tạo AWS clients
-        ecs_client = boto3.client('ecs')
-        ecr_client = boto3.client('ecr')
-        
         # Cấu hình service
         service_config = get_service_config(service_name, environment)
         
@@ -70,69 +113,44 @@ def lambda_handler(event, context):
 
 def get_service_config(service_name, environment):
     """Lấy cấu hình cho service"""
-    base_config = {
-        'auth-service': {
-            'cluster_name': f'restaurant-{environment}',
-            'service_name': f'auth-service-{environment}',
-            'repository_name': 'restaurant/auth-service',
-            'port': 8080,
-            'cpu': 256,
-            'memory': 512,
-            'desired_count': 2
-        },
-        'menu-service': {
-            'cluster_name': f'restaurant-{environment}',
-            'service_name': f'menu-service-{environment}',
-            'repository_name': 'restaurant/menu-service',
-            'port': 8081,
-            'cpu': 256,
-            'memory': 512,
-            'desired_count': 2
-        },
-        'order-service': {
-            'cluster_name': f'restaurant-{environment}',
-            'service_name': f'order-service-{environment}',
-            'repository_name': 'restaurant/order-service',
-            'port': 8082,
-            'cpu': 512,
-            'memory': 1024,
-            'desired_count': 3
-        },
-        'payment-service': {
-            'cluster_name': f'restaurant-{environment}',
-            'service_name': f'payment-service-{environment}',
-            'repository_name': 'restaurant/payment-service',
-            'port': 8083,
-            'cpu': 256,
-            'memory': 512,
-            'desired_count': 2
-        }
-    }
-    
-    if service_name not in base_config:
+    if service_name not in SERVICE_TEMPLATES:
         raise ValueError(f"Unknown service: {service_name}")
     
-    return base_config[service_name]
+    # Chỉ cluster/service name phụ thuộc environment
+    return {
+        'cluster_name': f'restaurant-{environment}',
+        'service_name': f'{service_name}-{environment}',
+        **SERVICE_TEMPLATES[service_name]
+    }
 
 def check_and_get_image(ecr_client, service_config, version):
     """Kiểm tra và lấy image URI từ ECR"""
     try:
         repository_name = service_config['repository_name']
+        region = ecr_client.meta.region_name
+        is_digest = version.startswith('sha256:')
+        
+        # Digest là immutable (image đã tồn tại từ lúc push), ECR_SKIP_VERIFY cho phép bỏ qua verify với tag:
+        # khi đã biết registry ID (từ invocation trước) thì không cần gọi ECR
+        if (is_digest or os.environ.get('ECR_SKIP_VERIFY') == '1') and repository_name in REGISTRY_ID_CACHE:
+            image_uri = build_image_uri(REGISTRY_ID_CACHE[repository_name], region, repository_name, version)
+            print(f"Using image without ECR verification: {image_uri}")
+            return image_uri
         
         # Lấy thông tin image
         response = ecr_client.describe_images(
             repositoryName=repository_name,
-            imageIds=[{'imageTag': version}]
+            imageIds=[{'imageDigest': version} if is_digest else {'imageTag': version}]
         )
         
         if not response['imageDetails']:
             raise ValueError(f"Image {repository_name}:{version} not found in ECR")
         
-        # Lấy registry ID từ response
+        # Lấy registry ID từ response và cache lại cho các invocations sau
         registry_id = response['imageDetails'][0]['registryId']
-        region = ecr_client.meta.region_name
+        REGISTRY_ID_CACHE[repository_name] = registry_id
         
-        image_uri = f"{registry_id}.dkr.ecr.{region}.amazonaws.com/{repository_name}:{version}"
+        image_uri = build_image_uri(registry_id, region, repository_name, version)
         print(f"Found image: {image_uri}")
         
         return image_uri
@@ -142,6 +160,11 @@ def check_and_get_image(ecr_client, service_config, version):
     except Exception as e:
         raise ValueError(f"Error checking ECR image: {str(e)}")
 
+def build_image_uri(registry_id, region, repository_name, version):
+    """Image URI trong ECR: repo@sha256:... cho digest, repo:tag cho tag"""
+    separator = '@' if version.startswith('sha256:') else ':'
+    return f"{registry_id}.dkr.ecr.{region}.amazonaws.com/{repository_name}{separator}{version}"
+
 def update_task_definition(ecs_client, service_config, image_uri, deployment_id):
     """Tạo hoặc cập nhật task definition"""
     try:
@@ -205,21 +228,8 @@ def deploy_to_ecs(ecs_client, service_config, task_definition_arn, environment):
         cluster_name = service_config['cluster_name']
         service_name = service_config['service_name']
         
-        # Kiểm tra service đã tồn tại chưa
         try:
-            services_response = ecs_client.describe_services(
-                cluster=cluster_name,
-                services=[service_name]
-            )
-            
-            service_exists = len(services_response['services']) > 0 and \
-                           services_response['services'][0]['status'] != 'INACTIVE'
-            
-        except Exception:
-            service_exists = False
-        
-        if service_exists:
-            # Cập nhật service hiện tại
+            # Cập nhật service hiện tại (không cần describe trước để kiểm tra tồn tại)
             response = ecs_client.update_service(
                 cluster=cluster_name,
                 service=service_name,
@@ -227,8 +237,9 @@ def deploy_to_ecs(ecs_client, service_config, task_definition_arn, environment):
                 desiredCount=service_config['desired_count']
             )
             print(f"Updated existing service: {service_name}")
-        else:
-            # Tạo service mới
+            
+        except (ecs_client.exceptions.ServiceNotFoundException, ecs_client.exceptions.ServiceNotActiveException):
+            # Service chưa tồn tại hoặc đã INACTIVE: tạo service mới
             response = ecs_client.create_service(
                 cluster=cluster_name,
                 serviceName=service_name,
@@ -251,46 +262,49 @@ def deploy_to_ecs(ecs_client, service_config, task_definition_arn, environment):
         raise ValueError(f"Error deploying to ECS: {str(e)}")
 
 def wait_for_deployment(ecs_client, cluster_name, service_name, max_wait_time=300):
-    """Chờ deployment hoàn thành"""
-    start_time = time.time()
+    """Chờ deployment hoàn thành bằng ECS waiter services_stable (polling do SDK quản lý)"""
+    try:
+        ecs_client.get_waiter('services_stable').wait(
+            cluster=cluster_name,
+            services=[service_name],
+            WaiterConfig={'Delay': 10, 'MaxAttempts': max(max_wait_time // 10, 1)}
+        )
+    except WaiterError as e:
+        if 'Max attempts exceeded' in str(e):
+            return {
+                'status': 'TIMEOUT',
+                'message': f'Deployment did not stabilize within {max_wait_time} seconds'
+            }
+        return {'status': 'ERROR', 'message': str(e)}
     
-    while time.time() - start_time < max_wait_time:
-        try:
-            response = ecs_client.describe_services(
-                cluster=cluster_name,
-                services=[service_name]
-            )
-            
-            service = response['services'][0]
-            deployments = service['deployments']
-            
-            # Tìm deployment PRIMARY
-            primary_deployment = None
-            for deployment in deployments:
-                if deployment['status'] == 'PRIMARY':
-                    primary_deployment = deployment
-                    break
-            
-            if primary_deployment:
-                running_count = primary_deployment['runningCount']
-                desired_count = primary_deployment['desiredCount']
-                
-                print(f"Deployment status: {running_count}/{desired_count} tasks running")
-                
-                if running_count == desired_count:
-                    return {
-                        'status': 'STABLE',
-                        'running_count': running_count,
-                        'desired_count': desired_count
-                    }
-            
-            time.sleep(10)
-            
-        except Exception as e:
-            print(f"Error checking deployment status: {str(e)}")
-            time.sleep(10)
+    # Service đã ổn định: lấy running/desired count của deployment PRIMARY cho kết quả
+    try:
+        response = ecs_client.describe_services(
+            cluster=cluster_name,
+            services=[service_name]
+        )
+    except Exception as e:
+        print(f"Error checking deployment status: {str(e)}")
+        return {'status': 'ERROR', 'message': str(e)}
+    
+    if not response['services']:
+        return {'status': 'ERROR', 'message': 'Service not found'}
+    
+    primary_deployment = next(
+        (d for d in response['services'][0]['deployments'] if d['status'] == 'PRIMARY'),
+        None
+    )
+    
+    if not primary_deployment:
+        return {'status': 'ERROR', 'message': 'No PRIMARY deployment found'}
+    
+    running_count = primary_deployment['runningCount']
+    desired_count = primary_deployment['desiredCount']
+    
+    print(f"Deployment status: {running_count}/{desired_count} tasks running")
     
     return {
-        'status': 'TIMEOUT',
-        'message': f'Deployment did not stabilize within {max_wait_time} seconds'
-    } 
\ No newline at end of file
+        'status': 'STABLE',
+        'running_count': running_count,
+        'desired_count': desired_count
+    }
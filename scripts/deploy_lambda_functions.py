@@ -5,17 +5,47 @@ Script để deploy tất cả Lambda functions lên AWS
 Usage: python scripts/deploy_lambda_functions.py
 """
 
+import functools
+import io
 import os
 import json
+import re
 import zipfile
 import boto3
 import yaml
+from botocore.config import Config
 import sys
 import time
 from pathlib import Path
-import tempfile
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 
+# Cấu hình chung cho mọi AWS clients của script: giữ kết nối keep-alive, đủ pool cho các calls song song,
+# adaptive retry để tự giãn nhịp gọi khi bị throttle
+AWS_CLIENT_CONFIG = Config(
+    tcp_keepalive=True,
+    max_pool_connections=16,
+    connect_timeout=5,
+    read_timeout=30,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+
+# Thời gian chờ (giây) giữa các lần thử create function khi IAM role chưa propagate
+ROLE_PROPAGATION_DELAYS = (1, 2, 4, 8, 16)
+
+# Lambda functions được tham chiếu bằng tên trong Step Functions template
+STEP_FUNCTIONS_LAMBDA_NAMES = (
+    'deployment-initializer',
+    'microservice-deployer',
+    'health-checker',
+    'final-health-checker',
+    'deployment-notifier',
+    'deployment-rollback'
+)
+FUNCTION_NAME_PATTERN = re.compile(
+    r'"FunctionName": "(' + '|'.join(re.escape(name) for name in STEP_FUNCTIONS_LAMBDA_NAMES) + r')"'
+)
+
+@functools.lru_cache(maxsize=1)
 def load_config():
     """Load cấu hình từ config file"""
     config_file = "config/aws_config.yaml"
@@ -26,10 +56,25 @@ def load_config():
         print(f"❌ Lỗi load config: {str(e)}")
         sys.exit(1)
 
+@functools.lru_cache(maxsize=1)
+def get_session():
+    """Boto3 session theo profile/region trong config, dùng chung cho cả script"""
+    config = load_config()
+    return boto3.Session(
+        profile_name=config['aws'].get('profile', 'default'),
+        region_name=config['aws']['region']
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_aws_client(service_name):
+    """Client dùng chung cho mọi bước của script (deploy, cleanup) để tái sử dụng connection pool"""
+    return get_session().client(service_name, config=AWS_CLIENT_CONFIG)
+
+@functools.lru_cache(maxsize=1)
 def get_account_id():
     """Lấy AWS Account ID"""
     try:
-        sts_client = boto3.client('sts')
+        sts_client = get_aws_client('sts')
         response = sts_client.get_caller_identity()
         return response['Account']
     except Exception as e:
@@ -37,34 +82,38 @@ def get_account_id():
         return "123456789012"
 
 def create_lambda_zip(function_name, source_dir="lambda_functions"):
-    """Tạo zip file cho Lambda function"""
+    """Tạo zip package (bytes) cho Lambda function"""
     source_file = f"{source_dir}/{function_name}.py"
     
     if not os.path.exists(source_file):
         print(f"❌ Không tìm thấy file: {source_file}")
         return None
     
-    # Tạo temp directory
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Copy source file
-        temp_source = os.path.join(temp_dir, "lambda_function.py")
-        shutil.copy2(source_file, temp_source)
-        
-        # Create zip file
-        zip_path = f"/tmp/{function_name}.zip"
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            zip_file.write(temp_source, "lambda_function.py")
-        
-        return zip_path
+    # Tạo zip trong memory, source file được ghi thẳng vào zip dưới tên lambda_function.py.
+    # compresslevel=1: nén nhanh nhất, package một file vài KB không cần nén kỹ
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
+        zip_file.write(source_file, "lambda_function.py")
+    
+    return zip_buffer.getvalue()
 
-def create_or_update_lambda_function(lambda_client, function_name, zip_path, role_arn, 
+def create_function_with_role_retry(lambda_client, create_params):
+    """Tạo Lambda function, retry với backoff khi IAM role mới tạo chưa được Lambda assume được"""
+    for delay in ROLE_PROPAGATION_DELAYS:
+        try:
+            return lambda_client.create_function(**create_params)
+        except lambda_client.exceptions.InvalidParameterValueException as e:
+            if 'role' not in str(e).lower():
+                raise
+            print(f"⏳ IAM role not ready for {create_params['FunctionName']}, retrying in {delay}s...")
+            time.sleep(delay)
+    
+    return lambda_client.create_function(**create_params)
+
+def create_or_update_lambda_function(lambda_client, function_name, zip_content, role_arn, 
                                    environment_vars=None, timeout=300, memory_size=512):
     """Tạo hoặc cập nhật Lambda function"""
     try:
-        # Đọc zip file
-        with open(zip_path, 'rb') as zip_file:
-            zip_content = zip_file.read()
-        
         # Kiểm tra function đã tồn tại chưa
         try:
             lambda_client.get_function(FunctionName=function_name)
@@ -112,7 +161,7 @@ def create_or_update_lambda_function(lambda_client, function_name, zip_path, rol
             if environment_vars:
                 create_params['Environment'] = {'Variables': environment_vars}
             
-            lambda_client.create_function(**create_params)
+            create_function_with_role_retry(lambda_client, create_params)
         
         # Chờ function active
         print(f"⏳ Waiting for {function_name} to be active...")
@@ -218,9 +267,12 @@ def create_execution_role(iam_client, role_name):
                 )
                 print(f"✅ Created IAM role and policy: {role_name}")
                 
-                # Chờ role được propagate
+                # Chờ role xuất hiện trong IAM; độ trễ propagate tới Lambda được xử lý bằng retry khi create function
                 print("⏳ Waiting for IAM role to propagate...")
-                time.sleep(10)
+                iam_client.get_waiter('role_exists').wait(
+                    RoleName=role_name,
+                    WaiterConfig={'Delay': 1, 'MaxAttempts': 20}
+                )
                 
             except Exception as e:
                 print(f"❌ Error creating role policy: {str(e)}")
@@ -232,6 +284,49 @@ def create_execution_role(iam_client, role_name):
         print(f"❌ Error creating IAM role: {str(e)}")
         return None
 
+def build_env_vars(account_id, region):
+    """Environment variables cho các Lambda functions: (chung, riêng cho deployment-notifier)"""
+    # Environment variables chung
+    common_env_vars = {
+        'AWS_REGION': region,
+        'AWS_ACCOUNT_ID': account_id,
+        'TASK_EXECUTION_ROLE_ARN': f"arn:aws:iam::{account_id}:role/ecsTaskExecutionRole",
+        'TASK_ROLE_ARN': f"arn:aws:iam::{account_id}:role/ecsTaskRole",
+        'SECURITY_GROUP_ID': 'sg-default',  # Update this
+        'SUBNET_IDS': 'subnet-default1,subnet-default2'  # Update this
+    }
+    
+    # Notification environment variables
+    notification_env_vars = {
+        **common_env_vars,
+        'SNS_TOPIC_ARN': f"arn:aws:sns:{region}:{account_id}:deployment-notifications",
+        'SENDER_EMAIL': 'deploy@yourcompany.com',
+        'RECIPIENT_EMAILS': 'team@yourcompany.com',
+        'SLACK_WEBHOOK_URL': 'https://hooks.slack.com/services/YOUR/WEBHOOK/URL'
+    }
+    
+    return common_env_vars, notification_env_vars
+
+def deploy_lambda_function(lambda_client, func_config, role_arn):
+    """Đóng gói và deploy một Lambda function, trả về True nếu thành công"""
+    print(f"\n📦 Processing: {func_config['name']}")
+    
+    # Tạo zip package
+    zip_content = create_lambda_zip(func_config['file'])
+    if not zip_content:
+        return False
+    
+    # Deploy function
+    return create_or_update_lambda_function(
+        lambda_client=lambda_client,
+        function_name=func_config['name'],
+        zip_content=zip_content,
+        role_arn=role_arn,
+        environment_vars=func_config['env_vars'],
+        timeout=func_config['timeout'],
+        memory_size=func_config['memory']
+    )
+
 def deploy_all_functions():
     """Deploy tất cả Lambda functions"""
     print("🚀 Starting Lambda functions deployment...")
@@ -243,13 +338,8 @@ def deploy_all_functions():
     
     # Khởi tạo AWS clients
     try:
-        session = boto3.Session(
-            profile_name=config['aws'].get('profile', 'default'),
-            region_name=region
-        )
-        
-        lambda_client = session.client('lambda')
-        iam_client = session.client('iam')
+        lambda_client = get_aws_client('lambda')
+        iam_client = get_aws_client('iam')
         
     except Exception as e:
         print(f"❌ Error initializing AWS clients: {str(e)}")
@@ -263,24 +353,7 @@ def deploy_all_functions():
         print("❌ Failed to create IAM role")
         return False
     
-    # Environment variables chung
-    common_env_vars = {
-        'AWS_REGION': region,
-        'AWS_ACCOUNT_ID': account_id,
-        'TASK_EXECUTION_ROLE_ARN': f"arn:aws:iam::{account_id}:role/ecsTaskExecutionRole",
-        'TASK_ROLE_ARN': f"arn:aws:iam::{account_id}:role/ecsTaskRole",
-        'SECURITY_GROUP_ID': 'sg-default',  # Update this
-        'SUBNET_IDS': 'subnet-default1,subnet-default2'  # Update this
-    }
-    
-    # Notification environment variables
-    notification_env_vars = common_env_vars.copy()
-    notification_env_vars.update({
-        'SNS_TOPIC_ARN': f"arn:aws:sns:{region}:{account_id}:deployment-notifications",
-        'SENDER_EMAIL': 'deploy@yourcompany.com',
-        'RECIPIENT_EMAILS': 'team@yourcompany.com',
-        'SLACK_WEBHOOK_URL': 'https://hooks.slack.com/services/YOUR/WEBHOOK/URL'
-    })
+    common_env_vars, notification_env_vars = build_env_vars(account_id, region)
     
     # Danh sách functions cần deploy
     functions_to_deploy = [
@@ -328,37 +401,16 @@ def deploy_all_functions():
         }
     ]
     
-    # Deploy từng function
-    success_count = 0
+    # Deploy các functions song song: mỗi function chủ yếu chờ API calls và waiter function_active
     total_count = len(functions_to_deploy)
     
-    for func_config in functions_to_deploy:
-        print(f"\n📦 Processing: {func_config['name']}")
-        
-        # Tạo zip file
-        zip_path = create_lambda_zip(func_config['file'])
-        if not zip_path:
-            continue
-        
-        try:
-            # Deploy function
-            success = create_or_update_lambda_function(
-                lambda_client=lambda_client,
-                function_name=func_config['name'],
-                zip_path=zip_path,
-                role_arn=role_arn,
-                environment_vars=func_config['env_vars'],
-                timeout=func_config['timeout'],
-                memory_size=func_config['memory']
-            )
-            
-            if success:
-                success_count += 1
-            
-        finally:
-            # Cleanup zip file
-            if os.path.exists(zip_path):
-                os.remove(zip_path)
+    with ThreadPoolExecutor(max_workers=total_count) as executor:
+        results = list(executor.map(
+            lambda func_config: deploy_lambda_function(lambda_client, func_config, role_arn),
+            functions_to_deploy
+        ))
+    
+    success_count = sum(1 for success in results if success)
     
     # Kết quả
     print(f"\n{'='*60}")
@@ -400,19 +452,11 @@ def update_step_functions_definition():
     with open(template_file, 'r') as f:
         definition = f.read()
     
-    # Function name mappings
-    function_mappings = {
-        'deployment-initializer': f"arn:aws:lambda:{region}:{account_id}:function:deployment-initializer",
-        'microservice-deployer': f"arn:aws:lambda:{region}:{account_id}:function:microservice-deployer",
-        'health-checker': f"arn:aws:lambda:{region}:{account_id}:function:health-checker",
-        'final-health-checker': f"arn:aws:lambda:{region}:{account_id}:function:final-health-checker",
-        'deployment-notifier': f"arn:aws:lambda:{region}:{account_id}:function:deployment-notifier",
-        'deployment-rollback': f"arn:aws:lambda:{region}:{account_id}:function:deployment-rollback"
-    }
-    
-    # Replace function names với ARNs
-    for func_name, func_arn in function_mappings.items():
-        definition = definition.replace(f'"FunctionName": "{func_name}"', f'"FunctionName": "{func_arn}"')
+    # Replace function names với ARNs trong một lần quét definition
+    definition = FUNCTION_NAME_PATTERN.sub(
+        lambda match: f'"FunctionName": "arn:aws:lambda:{region}:{account_id}:function:{match.group(1)}"',
+        definition
+    )
     
     # Lưu updated definition
     updated_file = template_file.replace('.json', '_updated.json')
@@ -426,13 +470,7 @@ def cleanup_old_versions():
     """Dọn dẹp các versions cũ của Lambda functions"""
     print("\n🧹 Cleaning up old Lambda function versions...")
     
-    config = load_config()
-    session = boto3.Session(
-        profile_name=config['aws'].get('profile', 'default'),
-        region_name=config['aws']['region']
-    )
-    
-    lambda_client = session.client('lambda')
+    lambda_client = get_aws_client('lambda')
     
     function_names = [
         'deployment-initializer',
@@ -443,28 +481,52 @@ def cleanup_old_versions():
         'deployment-rollback'
     ]
     
-    for func_name in function_names:
-        try:
-            # Lấy danh sách versions
-            response = lambda_client.list_versions_by_function(FunctionName=func_name)
-            versions = response['Versions']
-            
-            # Xóa versions cũ (giữ lại $LATEST và 2 versions gần nhất)
-            versions_to_delete = [v for v in versions if v['Version'] not in ['$LATEST']]
-            
-            if len(versions_to_delete) > 2:
-                for version in versions_to_delete[:-2]:  # Keep last 2 versions
-                    try:
-                        lambda_client.delete_function(
-                            FunctionName=func_name,
-                            Qualifier=version['Version']
-                        )
-                        print(f"🗑️ Deleted {func_name} version {version['Version']}")
-                    except Exception as e:
-                        print(f"⚠️ Could not delete {func_name} version {version['Version']}: {str(e)}")
-                        
-        except Exception as e:
-            print(f"⚠️ Could not cleanup {func_name}: {str(e)}")
+    # Lấy danh sách versions cần xóa của các functions song song
+    with ThreadPoolExecutor(max_workers=len(function_names)) as executor:
+        stale_versions = list(executor.map(
+            lambda func_name: get_stale_versions(lambda_client, func_name),
+            function_names
+        ))
+    
+    # Xóa tất cả versions cũ song song, client đã có pool 16 connections
+    versions_to_delete = [
+        (func_name, version)
+        for func_name, versions in zip(function_names, stale_versions)
+        for version in versions
+    ]
+    
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(
+            lambda item: delete_function_version(lambda_client, *item),
+            versions_to_delete
+        ))
+
+def get_stale_versions(lambda_client, func_name):
+    """Các versions cũ cần xóa của một function (giữ lại $LATEST và 2 versions gần nhất)"""
+    try:
+        # Lấy danh sách versions (paginator để không bỏ sót khi có hơn 50 versions)
+        versions = []
+        for page in lambda_client.get_paginator('list_versions_by_function').paginate(FunctionName=func_name):
+            versions.extend(page['Versions'])
+        
+        versions_to_delete = [v['Version'] for v in versions if v['Version'] not in ['$LATEST']]
+        
+        return versions_to_delete[:-2]  # Keep last 2 versions
+        
+    except Exception as e:
+        print(f"⚠️ Could not cleanup {func_name}: {str(e)}")
+        return []
+
+def delete_function_version(lambda_client, func_name, version):
+    """Xóa một version của Lambda function"""
+    try:
+        lambda_client.delete_function(
+            FunctionName=func_name,
+            Qualifier=version
+        )
+        print(f"🗑️ Deleted {func_name} version {version}")
+    except Exception as e:
+        print(f"⚠️ Could not delete {func_name} version {version}: {str(e)}")
 
 if __name__ == "__main__":
     import argparse